@@ -3,6 +3,8 @@ from flask_login import LoginManager, current_user, login_required, login_user,
 from flask_cors import CORS
 from flask_session import Session
 import os
+from server.controllers.password_hasher import PASSWORD_HASHER
+from server.controllers.session_store import SESSION_BACKEND, make_session_interface
 from server.controllers.user_manager import User
 
 from server.views import blog
@@ -17,8 +19,11 @@ app.secret_key = 'test_key2' # TODO Temporarily, a fixed key is used to keep the
 
 # Session
 app.config['SESSION_PERMANENT'] = False
-app.config['SESSION_TYPE'] = "filesystem"
-Session(app)
+if SESSION_BACKEND == 'filesystem':
+    app.config['SESSION_TYPE'] = "filesystem"
+    Session(app)
+else:
+    app.session_interface = make_session_interface(SESSION_BACKEND)
 
 # Blutprint
 app.register_blueprint(blog.blog, url_prefix='/blog')
@@ -28,6 +33,9 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.session_protection = 'strong'
 
+# Logs the queue depth and timings of the password hashing pool
+PASSWORD_HASHER.start_reporting()
+
 
 # A hook to return an instance of User class, using the user_id included in the session information
 @login_manager.user_loader
@@ -41,4 +49,4 @@ def unauthorized():
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port='8080', debug=True)
+    app.run(host='0.0.0.0', port='8080', debug=True, threaded=True)
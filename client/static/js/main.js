@@ -1,4 +1,6 @@
 var searchResult = []
+var searchKeyword = '';
+var searchCursor = null;
 
 function changeTab(name) {
     document.getElementById('tab-search').classList.toggle('d-none', name !== 'search');
@@ -16,23 +18,72 @@ async function searchGame(e) {
     if (askingSection) {
         askingSection.remove();
     }
-    const searchKeyword = document.getElementById('search_keyword').value;
-    const url = `/blog/search?search_keyword=${encodeURIComponent(searchKeyword)}`;
-    
+    searchKeyword = document.getElementById('search_keyword').value;
+    searchResult = []; // stores the search result in the global variable.
+    searchCursor = null;
+    fetchSearchPage();
+}
+
+// Fetches the next page of the search result and appends it to the table
+function fetchSearchPage() {
+    var url = `/blog/search?search_keyword=${encodeURIComponent(searchKeyword)}`;
+    if (searchCursor) {
+        url += `&cursor=${encodeURIComponent(searchCursor)}`;
+    }
+
     fetch(url)
     .then(response => response.json())
     .then(data => {
-        searchResult = data; // stores the search result in the global variable.
-
-        const tableBody = document.querySelector('#seach-result-table tbody');
-        tableBody.innerHTML = '';
-        createSearchResultTable(data);
+        searchResult = searchResult.concat(flattenReleases(data.games));
+        searchCursor = data.next_cursor;
+        createSearchResultTable(searchResult);
     })
     .catch(error => {
         console.error('Error fetching data:', error);
     })
 }
 
+// Makes a row per release of each game, as a game is added with one of its releases
+function flattenReleases(games) {
+    const rows = [];
+    games.forEach(game => {
+        const { releases, ...metadata } = game;
+        releases.forEach(release => {
+            rows.push({ ...metadata, ...release });
+        });
+    });
+    return rows;
+}
+
+var suggestTimer = null;
+
+// Suggests titles per keystroke, waiting a little so that fast typing sends one request
+function suggestTitles(e) {
+    clearTimeout(suggestTimer);
+    const prefix = e.target.value;
+    const suggestionList = document.getElementById('search_suggestions');
+    if (prefix.trim().length < 2) {
+        suggestionList.innerHTML = '';
+        return;
+    }
+
+    suggestTimer = setTimeout(() => {
+        fetch(`/blog/suggest?prefix=${encodeURIComponent(prefix)}`)
+        .then(response => response.json())
+        .then(titles => {
+            suggestionList.innerHTML = '';
+            titles.forEach(title => {
+                const option = document.createElement('option');
+                option.value = title;
+                suggestionList.appendChild(option);
+            });
+        })
+        .catch(error => {
+            console.error('Error fetching data:', error);
+        })
+    }, 100);
+}
+
 function createSearchResultTable(data) {
     const tableBody = document.querySelector('#seach-result-table tbody');
     tableBody.innerHTML = '';
@@ -68,6 +119,19 @@ function createSearchResultTable(data) {
         row.children[0].appendChild(button)
         tableBody.appendChild(row);
     });
+
+    if (searchCursor) {
+        const row = document.createElement('tr');
+        row.innerHTML = '<td colspan="7"></td>';
+        const moreButton = document.createElement('button');
+        moreButton.textContent = 'MORE';
+        moreButton.onclick = () => {
+            moreButton.disabled = true;
+            fetchSearchPage();
+        }
+        row.children[0].appendChild(moreButton);
+        tableBody.appendChild(row);
+    }
 }
 
 function cleanAskingSection() {
@@ -223,15 +287,32 @@ async function setExpectionLevel() {
 
 
 // For tracker tab
+var gameListCursor = null;
+
 async function fetchUserGameList() {
-    fetch('/blog/get_user_game_list')
+    const tableBody = document.querySelector('#user-game-list-table tbody');
+    tableBody.innerHTML = '';
+    gameListCursor = null;
+    fetchGameListPage();
+}
+
+// Fetches the next page of the user's game list and appends it to the table
+function fetchGameListPage() {
+    var url = '/blog/get_user_game_list';
+    if (gameListCursor) {
+        url += `?cursor=${encodeURIComponent(gameListCursor)}`;
+    }
+
+    fetch(url)
     .then(response => response.json())
     .then(data => {
         const tableBody = document.querySelector('#user-game-list-table tbody');
-        tableBody.innerHTML = '';
+        const moreRow = document.getElementById('game-list-more');
+        if (moreRow) {
+            moreRow.remove();
+        }
 
-        data.forEach(game => {
-            console.log(`debug: ${game}`)
+        data.games.forEach(game => {
             const row = document.createElement('tr');
             
             row.innerHTML = `
@@ -247,6 +328,21 @@ async function fetchUserGameList() {
             // row.children[2].appendChild(dropdown)
             tableBody.appendChild(row);
         });
+
+        gameListCursor = data.next_cursor;
+        if (gameListCursor) {
+            const row = document.createElement('tr');
+            row.setAttribute('id', 'game-list-more');
+            row.innerHTML = '<td colspan="4"></td>';
+            const moreButton = document.createElement('button');
+            moreButton.textContent = 'MORE';
+            moreButton.onclick = () => {
+                moreButton.disabled = true;
+                fetchGameListPage();
+            }
+            row.children[0].appendChild(moreButton);
+            tableBody.appendChild(row);
+        }
     })
     .catch(error => {
         console.error('Error fetching data:', error);
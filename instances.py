@@ -1,16 +1,83 @@
 import asyncio
-import nest_asyncio
+import atexit
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Coroutine, Optional
 from server.controllers.game_manager import GameManager
+from server.models.http_client import close_http_client
+from server.models.mongodb import close_mongo_client, ensure_mongo_indexes
 from server.models.mysqldb import init_db, local_db_host, local_db_passwd, local_db_port, local_db_user, game_db_schema_path
 
+# The timeout in seconds for a coroutine submitted from a Flask worker thread.
+ASYNC_CALL_TIMEOUT = 120
+
 
 # Initializes game_db and creates an instance of GameManager.
-# Note that due to the limit of Flask, the async functions are called synchronously.
-# TODO refactor to avoid calling nest_asyncio
-nest_asyncio.apply()
+# Flask views are synchronous and run on worker threads, so a single event loop runs forever on a dedicated
+# background thread and the views submit coroutines to it with `run_coroutine_threadsafe`.
+# This lets many requests await the aiomysql pool concurrently instead of serializing on `run_until_complete`.
 loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
+loop_thread = threading.Thread(target=loop.run_forever, name='game-manager-loop', daemon=True)
+loop_thread.start()
+
+
+def submit_async(coroutine: Coroutine) -> Future:
+    """Schedules a coroutine on the background loop without waiting for it.
+
+    Args:
+        coroutine: the coroutine to run on the background loop.
+
+    Returns:
+        a `concurrent.futures.Future` holding the result of the coroutine.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, loop)
+
+
+def run_async(coroutine: Coroutine, timeout: Optional[float] = ASYNC_CALL_TIMEOUT) -> Any:
+    """Runs a coroutine on the background loop and blocks the calling thread until it finishes.
+
+    Args:
+        coroutine: the coroutine to run on the background loop.
+        timeout: the number of seconds to wait for the result.
 
-game_db_pool = loop.run_until_complete(init_db(host=local_db_host, port=local_db_port, user=local_db_user, 
-                                passwd=local_db_passwd, db_name='game_db', schema_path=game_db_schema_path))
+    Returns:
+        the result of the coroutine.
+
+    Raises:
+        TimeoutError: if the coroutine didn't finish in time, in which case it's cancelled.
+    """
+    if threading.current_thread() is loop_thread:
+        raise RuntimeError('`run_async()` cannot be called from the background loop itself.')
+    future = submit_async(coroutine)
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        # Otherwise the coroutine keeps running on the loop, holding its pooled connection and its HTTP slot.
+        future.cancel()
+        raise
+
+
+def report_exit(name: str) -> Callable[[Future], None]:
+    """Makes a done-callback printing the exception that stopped a background task, which would otherwise go unnoticed."""
+    def callback(future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            print(f'{name} has stopped | {future.exception()!r}')
+    return callback
+
+
+game_db_pool = run_async(init_db(host=local_db_host, port=local_db_port, user=local_db_user,
+                                 passwd=local_db_passwd, db_name='game_db', schema_path=game_db_schema_path))
 game_manager = GameManager(loop, game_db_pool)
+run_async(game_manager.build_search_index())
+# Keeps `released` of date_platform_table up to date once a day, so that no request has to compare dates itself.
+release_sweeper = submit_async(game_manager.run_release_sweeper())
+release_sweeper.add_done_callback(report_exit('The release sweeper'))
+# Indexes the games other processes insert, which this process would otherwise never see.
+search_index_refresher = submit_async(game_manager.run_search_index_refresher())
+search_index_refresher.add_done_callback(report_exit('The search index refresher'))
+ensure_mongo_indexes()
+
+
+# Closes the pooled Wikidata connections before the background loop goes away.
+atexit.register(lambda: run_async(close_http_client()))
+atexit.register(close_mongo_client)
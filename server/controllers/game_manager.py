@@ -1,45 +1,137 @@
 """Manage games by registering, and updating them."""
-from datetime import datetime
-from server.models.mysqldb import query_db_with_pool, IntegrityError
+import asyncio
+import base64
+import json
+from datetime import date, datetime, timedelta
+from server.models.mysqldb import query_db_with_pool, transaction_with_pool, IntegrityError, OperationalError
+from server.controllers.cache import TTLCache, normalize_key
+from server.controllers.search_index import SearchIndex
+from server.controllers.suggest_index import TitleTrie, SUGGEST_TOP_K
+from server.models.entity_store import EntityStore, entity_store_path, ENTITY_STORE_MAX_AGE
 from server.models.game import Game
-import httpx
+from server.models.http_client import get_json, WIKIDATA_API_URL
+from server.models.property_index import LearnedLabelStore, PropertyIndex, learned_labels_path, property_json_path, property_index_path
 from tabulate import tabulate # temp mesure for user interaction
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 import os
-import json
+import time
 
 URL_METACRITIC = 'https://www.metacritic.com/game/'
 URL_OPENCRITIC = 'https://opencritic.com/game/'
 date_pattern = r'^\d{4}-\d{2}-\d{2}$'
-property_json_path = os.path.join(os.getcwd(), 'server', 'schemas', 'wikidata_properties.json')
+WIKIDATA_MAX_IDS = 50 # the maximum number of entity codes `wbgetentities` accepts per request
+INSERT_BATCH_SIZE = 500 # the maximum number of rows per multi-row INSERT
+INSERT_MAX_ATTEMPTS = 3 # the number of tries of `_insert_games` when a concurrent writer gets in the way
+RETRYABLE_MYSQL_ERRORS = (1205, 1213) # lock wait timeout and deadlock, after which the whole transaction can be retried
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 1024)) # the number of search results kept in memory
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', 600)) # seconds
+NEGATIVE_CACHE_SIZE = int(os.getenv('NEGATIVE_CACHE_SIZE', 4096)) # the number of titles known to have no games
+NEGATIVE_CACHE_TTL = float(os.getenv('NEGATIVE_CACHE_TTL', 3600)) # seconds
+SEARCH_RESULT_LIMIT = int(os.getenv('SEARCH_RESULT_LIMIT', 500)) # the number of games ranked per search, across every page
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 20)) # the number of games per page of search results
+SEARCH_INDEX_REFRESH_INTERVAL = float(os.getenv('SEARCH_INDEX_REFRESH_INTERVAL', 60)) # seconds between reads of the games added by other processes
+# The lengths of the VARCHAR columns in `game_db_schema.sql`, so that one overlong value cannot fail a whole batch in strict mode
+GAME_COLUMN_LENGTHS = {'title': 255, 'aliases': 1024, 'wikidata_code': 100, 'genres': 1024, 'developers': 255, 'publishers': 255, 'parent_id': 255}
+RELEASE_PLATFORMS_LENGTH = 255
+RELEASE_CACHE_SIZE = int(os.getenv('RELEASE_CACHE_SIZE', 8192)) # the number of releases of user game lists kept in memory
+RELEASE_CACHE_TTL = float(os.getenv('RELEASE_CACHE_TTL', 600)) # seconds
+RELEASE_SWEEP_HOUR = int(os.getenv('RELEASE_SWEEP_HOUR', 0)) # the local hour at which `released` is updated every day
+RELEASE_INDEX_NAME = 'release_date_released_idx'
+
+
+def fit_column(value: Any, length: int) -> Any:
+    """Cuts a string down to the length of its column, after the last complete item if it's a comma-separated list."""
+    if not isinstance(value, str) or len(value) <= length:
+        return value
+    last_separator = value.rfind(', ', 0, length + 2) # the last separator right after an item that fits
+    return value[:last_separator] if last_separator > 0 else value[:length]
+
+
+def encode_search_cursor(game_id: int, score: float) -> str:
+    """Encodes the rank of the last game of a page into an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps([game_id, score]).encode('utf-8')).decode('ascii')
+
+
+def decode_search_cursor(cursor: str) -> Tuple[int, float]:
+    """Decodes a cursor made by `encode_search_cursor` into (game_id, score).
+
+    Raises:
+        ValueError: if the cursor is malformed.
+    """
+    try:
+        game_id, score = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return int(game_id), float(score)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f'Invalid search cursor: {cursor}') from e
 
 
 class GameManager:
     """A manager class that process data from game_db or Wikidata to create Game instances"""
-    def __init__(self, loop, pool):
+    def __init__(self, loop, pool, offline: bool = False):
         self.loop = loop
         self.pool = pool
-        self.properties = self._load_json_for_properties(property_json_path)
+        self.offline = offline # only uses the entities stored in `entity_store` without requesting Wikidata
+        self.api_url = WIKIDATA_API_URL
+        self.entity_store = EntityStore(entity_store_path)
+        self.property_index = PropertyIndex(property_json_path, property_index_path) # opened on the first lookup
+        self.learned_labels = LearnedLabelStore(learned_labels_path) # labels of the codes missing from `property_index`
+        self.label_stats = {'index_hits': 0, 'learned_hits': 0, 'misses': 0, 'learned': 0, 'requests': 0}
+        self.search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+        self.negative_cache = TTLCache(maxsize=NEGATIVE_CACHE_SIZE, ttl=NEGATIVE_CACHE_TTL)
+        self.release_cache = TTLCache(maxsize=RELEASE_CACHE_SIZE, ttl=RELEASE_CACHE_TTL)
+        self.release_listeners: List[Callable[[List[int]], Any]] = [] # called with the release_ids that have just been released
+        self.in_flight_searches: Dict[str, asyncio.Future] = {}
+        self.search_index = SearchIndex()
+        self.search_index_ready = False # until built, searches fall back to the FULLTEXT index of MySQL
+        self.search_index_marks = (0, 0) # the largest game_ids indexed by the last two refreshes
+        self.suggest_index = TitleTrie()
+
+
+    async def find_candiates(self, search_title: str, limit: int = SEARCH_PAGE_SIZE, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Provides a page of candiates by searching game_db or Wikidata.
+
+        The games are paginated by keyset: `next_cursor` encodes the rank of the last game of the page,
+        and passing it back returns the games ranked after it.
+        The pages are cached by the case and whitespace folded title until `_add_new_games` adds games.
+        Titles that produced no games even from Wikidata are remembered in `negative_cache` for a while.
 
-
-    async def find_candiates(self, search_title: str):
-        """Provides a list of candiates by searching game_db or Wikidata.
-        
         Args:
             search_title: the user's input for the game title to search for.
-        """
-        try:
-            candidates = None
-
-            response = await self._search_game_db(search_title)
-            if len(response) == 0:
-                entity_codes = self._search_wikidata(search_title)
-                await self._add_new_games(entity_codes)
-                response = await self._search_game_db(search_title)
+            limit: the maximum number of games in the page.
+            cursor: the `next_cursor` of the previous page, None for the first page.
 
-            candidates = self._make_candidate_list(response)
+        Returns:
+            {'games': the games of the page with their releases, 'next_cursor': the cursor of the next page or None}
 
-            return candidates
+        Raises:
+            ValueError: if the cursor is malformed.
+        """
+        after = decode_search_cursor(cursor) if cursor else None
+        try:
+            cache_key = normalize_key(search_title)
+            page_key = (cache_key, limit, cursor)
+            page = self.search_cache.get(page_key)
+            if page is not None:
+                return page
+            if cache_key in self.negative_cache:
+                return {'games': [], 'next_cursor': None}
+
+            ranked_games = await self._search_game_db(search_title)
+            if len(ranked_games) == 0:
+                ranked_games = await self._search_wikidata_once(cache_key, search_title)
+                if len(ranked_games) == 0:
+                    return {'games': [], 'next_cursor': None}
+
+            if after is not None:
+                ranked_games = [(game_id, score) for game_id, score in ranked_games if (-score, game_id) > (-after[1], after[0])]
+            page_games = ranked_games[:limit]
+            response = await self._hydrate_games([game_id for game_id, _ in page_games])
+            next_cursor = encode_search_cursor(*page_games[-1]) if len(ranked_games) > limit else None
+
+            page = {'games': self._make_candidate_list(response), 'next_cursor': next_cursor}
+            self.search_cache.put(page_key, page)
+
+            return page
 
         except IntegrityError as e:
             raise IntegrityError(f'IntegrityError has occurred. | {e.__cause__}') from e
@@ -47,55 +139,243 @@ class GameManager:
             raise RuntimeError(f'Error occurred in `find_candiates()`: {e}') from e
 
 
-    async def _search_game_db(self, search_title) -> Any:
-        """Searches game_db for a game"""
+    async def _search_wikidata_once(self, cache_key: str, search_title: str) -> List[Tuple[int, float]]:
+        """Falls back to Wikidata with at most one upstream fetch in flight per normalized title.
+
+        Concurrent callers with the same title await the fetch already in flight instead of starting their own.
+
+        Args:
+            cache_key: the normalized search title.
+            search_title: the user's input for the game title to search for.
+
+        Returns:
+            the ranked games of searching game_db again after adding the games found in Wikidata.
+        """
+        in_flight = self.in_flight_searches.get(cache_key)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(self._add_games_from_wikidata(cache_key, search_title))
+            self.in_flight_searches[cache_key] = in_flight
+            in_flight.add_done_callback(lambda _: self.in_flight_searches.pop(cache_key, None))
+        # Shielded so that a caller giving up does not cancel the fetch the other callers are waiting for.
+        return await asyncio.shield(in_flight)
+
+
+    async def _add_games_from_wikidata(self, cache_key: str, search_title: str) -> List[Tuple[int, float]]:
+        """Adds the games found in Wikidata into game_db and searches game_db again."""
+        entity_codes = await self._search_wikidata(search_title)
+        await self._add_new_games(entity_codes)
+        ranked_games = await self._search_game_db(search_title)
+        if len(ranked_games) == 0:
+            self.negative_cache.put(cache_key, True)
+        return ranked_games
+
+
+    async def build_search_index(self) -> None:
+        """Builds `search_index` and `suggest_index` from every game in `game_table`."""
+        response = await query_db_with_pool(self.pool, 'SELECT', 'SELECT game_id, title, aliases FROM game_table;')
+        for element in response:
+            self.search_index.add(element['game_id'], element['title'], element['aliases'])
+            self.suggest_index.add(element['title'], element['aliases'])
+        max_game_id = max((element['game_id'] for element in response), default=0)
+        self.search_index_marks = (max_game_id, max_game_id)
+        self.search_index_ready = True
+        print(f'The search index has been built with {len(self.search_index)} games.')
+
+
+    async def refresh_search_index(self) -> int:
+        """Adds the games inserted into `game_table` by other processes since the last refresh to `search_index` and `suggest_index`.
+
+        The games after the mark of the refresh before the last one are read, as concurrent transactions may commit
+        a game_id lower than one already seen. Adding a game that is already indexed replaces it.
+
+        Returns:
+            the number of games read.
+        """
+        previous_mark, last_mark = self.search_index_marks
+        response = await query_db_with_pool(self.pool, 'SELECT', 'SELECT game_id, title, aliases FROM game_table WHERE game_id > %s;', (previous_mark,))
+        for element in response:
+            self.search_index.add(element['game_id'], element['title'], element['aliases'])
+            self.suggest_index.add(element['title'], element['aliases'])
+        self.search_index_marks = (last_mark, max([last_mark] + [element['game_id'] for element in response]))
+        if any(element['game_id'] > last_mark for element in response):
+            self.search_cache.clear()
+            self.negative_cache.clear()
+        return len(response)
+
+
+    async def run_search_index_refresher(self) -> None:
+        """Runs `refresh_search_index` every `SEARCH_INDEX_REFRESH_INTERVAL` seconds, until cancelled."""
+        while True:
+            await asyncio.sleep(SEARCH_INDEX_REFRESH_INTERVAL)
+            try:
+                await self.refresh_search_index()
+            except Exception as e:
+                print(f'Error occurred in `refresh_search_index()` | {e}')
+
+
+    def add_release_listener(self, listener: Callable[[List[int]], Any]) -> None:
+        """Registers a function to be called with the release_ids flipped to released by `sweep_release_status`."""
+        self.release_listeners.append(listener)
+
+
+    async def ensure_release_index(self) -> None:
+        """Adds the index on (release_date, released) to a `date_platform_table` created before the schema had it."""
+        response = await query_db_with_pool(self.pool, 'SELECT', 'SHOW INDEX FROM date_platform_table WHERE Key_name = %s;', (RELEASE_INDEX_NAME,))
+        if not response:
+            await query_db_with_pool(self.pool, 'UPDATE', f'CREATE INDEX {RELEASE_INDEX_NAME} ON date_platform_table (release_date, released);')
+
+
+    async def sweep_release_status(self, today: Optional[date] = None) -> List[int]:
+        """Marks every release whose date has come as released, with one set-based UPDATE on the (release_date, released) index.
+
+        The cached search results and releases are dropped if anything changed, and `release_listeners` are notified.
+
+        Args:
+            today: the date to compare the release dates with, today by default.
+
+        Returns:
+            the release_ids that have just been released.
+        """
+        today = today or date.today()
+        async with transaction_with_pool(self.pool) as db_cursor:
+            # The rows are locked so that the UPDATE changes exactly the rows reported.
+            await db_cursor.execute('SELECT release_id FROM date_platform_table WHERE release_date <= %s AND released = 0 FOR UPDATE;', (today,))
+            release_ids = [row['release_id'] for row in await db_cursor.fetchall()]
+            if release_ids:
+                await db_cursor.execute('UPDATE date_platform_table SET released = 1 WHERE release_date <= %s AND released = 0;', (today,))
+
+        if release_ids:
+            self.search_cache.clear()
+            self.release_cache.clear()
+            for listener in self.release_listeners:
+                try:
+                    listener(release_ids)
+                except Exception as e:
+                    print(f'Error occurred in a release listener | {e}')
+        return release_ids
+
+
+    async def run_release_sweeper(self) -> None:
+        """Runs `sweep_release_status` right away and then every day at `RELEASE_SWEEP_HOUR`, until cancelled.
+
+        `ensure_release_index` is retried before each sweep until it succeeds; the sweep runs without the index meanwhile.
+        """
+        release_index_ready = False
+        while True:
+            if not release_index_ready:
+                try:
+                    await self.ensure_release_index()
+                    release_index_ready = True
+                except Exception as e:
+                    # e.g. another process created the index between SHOW INDEX and CREATE INDEX
+                    print(f'Error occurred in `ensure_release_index()` | {e}')
+            try:
+                release_ids = await self.sweep_release_status()
+                print(f'{len(release_ids)} releases have been marked as released.')
+            except Exception as e:
+                print(f'Error occurred in `sweep_release_status()` | {e}')
+
+            now = datetime.now()
+            next_sweep = now.replace(hour=RELEASE_SWEEP_HOUR, minute=0, second=0, microsecond=0)
+            if next_sweep <= now:
+                next_sweep += timedelta(days=1)
+            await asyncio.sleep((next_sweep - now).total_seconds())
+
+
+    def suggest_titles(self, prefix: str, limit: int = SUGGEST_TOP_K) -> List[str]:
+        """Suggests the titles in game_db matching what the user has typed so far, without querying game_db or Wikidata.
+
+        Args:
+            prefix: what the user has typed so far.
+            limit: the maximum number of titles to suggest.
+        """
+        return self.suggest_index.suggest(prefix, limit)
+
+
+    async def _search_game_db(self, search_title) -> List[Tuple[int, float]]:
+        """Ranks the games in game_db matching the title, best first.
+
+        The games are ranked in memory by `search_index`, or by the FULLTEXT index of MySQL until it's built
+        or when it has no match. Games inserted by other processes join `search_index` at the next `refresh_search_index`,
+        so for up to `SEARCH_INDEX_REFRESH_INTERVAL` they are missing from a search that has other matches.
+        Either way only the best `SEARCH_RESULT_LIMIT` are kept, sorted by descending score, then by ascending game_id.
+
+        Returns:
+            a list of (game_id, score).
+        """
+        if self.search_index_ready:
+            ranked_games = self.search_index.search(search_title, limit=SEARCH_RESULT_LIMIT)
+            if ranked_games:
+                return ranked_games
+
         select_query = """
-                        SELECT *, MATCH(title, aliases) AGAINST(%s) AS relevance
-                        FROM game_table 
-                        INNER JOIN date_platform_table
-                        ON game_table.game_id = date_platform_table.game_id
+                        SELECT game_id, MATCH(title, aliases) AGAINST(%s IN NATURAL LANGUAGE MODE) AS relevance
+                        FROM game_table
                         WHERE MATCH(title, aliases) AGAINST(%s IN NATURAL LANGUAGE MODE)
-                        HAVING relevance > 7.0;"""
-        select_values = (search_title, search_title)
-        await query_db_with_pool(self.pool, 'USE', 'USE game_db;')
+                        HAVING relevance > 7.0
+                        ORDER BY relevance DESC, game_id
+                        LIMIT %s;"""
+        select_values = (search_title, search_title, SEARCH_RESULT_LIMIT)
         response = await query_db_with_pool(self.pool, 'SELECT', select_query, select_values)
-        return response
+        return [(element['game_id'], float(element['relevance'])) for element in response]
+
 
+    async def _hydrate_games(self, game_ids: List[int]) -> List[Dict[str, Any]]:
+        """Reads the games and their releases from game_db, in the order of the given game_ids.
+
+        Only the columns shown to the user are selected.
+        """
+        if not game_ids:
+            return []
+        select_query = f"""
+                        SELECT game_table.game_id, title, is_DLC, aliases, wikidata_code, genres, developers, publishers,
+                               release_id, release_date, released, date_platform_table.platforms
+                        FROM game_table
+                        INNER JOIN date_platform_table
+                        ON game_table.game_id = date_platform_table.game_id
+                        WHERE game_table.game_id IN ({', '.join(['%s'] * len(game_ids))});"""
+        response = await query_db_with_pool(self.pool, 'SELECT', select_query, tuple(game_ids))
+        ranks = {game_id: rank for rank, game_id in enumerate(game_ids)}
+        return sorted(response, key=lambda element: (ranks[element['game_id']], element['release_id']))
 
-    def _make_candidate_list(self, response) -> List[Dict[str, str]]:
-        """Makes a list of games found in game_db with their metadata.
+
+    def _make_candidate_list(self, response) -> List[Dict[str, Any]]:
+        """Makes a list of games found in game_db with their metadata, grouping the releases of each game.
 
         Args:
-            sql_response : The response of SQL query containing games from game_db.
+            response: The rows of `game_table` joined with `date_platform_table`, sorted by game.
 
         Returns:
-            game_candidates : A list of dictionaries containing multiple games' metadata.
+            game_candidates : A list of dictionaries containing multiple games' metadata and their `releases`.
         """
         game_candidates: List[Dict[str, Any]] = []
 
         for element in response:
-            candidate = {
-                'game_id': element.get('game_id', None),
+            if not game_candidates or game_candidates[-1]['game_id'] != element['game_id']:
+                game_candidates.append({
+                    'game_id': element.get('game_id', None),
+                    'title': element.get('title', None),
+                    'is_DLC': element.get('is_DLC', None),
+                    'aliases': element.get('aliases', None),
+                    'wikidata_code': element.get('wikidata_code', None),
+                    'genres': element.get('genres', None),
+                    'developers': element.get('developers', None),
+                    'publishers': element.get('publishers', None),
+                    'releases': []
+                    })
+            release_date = element.get('release_date', None)
+            game_candidates[-1]['releases'].append({
                 'release_id': element.get('release_id', None),
-                'title': element.get('title', None),
-                'is_DLC': element.get('is_DLC', None),
-                'aliases': element.get('aliases', None),
-                'wikidata_code': element.get('wikidata_code', None),
-                'genres': element.get('genres', None),
-                'developers': element.get('developers', None),
-                'publishers': element.get('publishers', None),
-                'release_date': element.get('release_date', None).strftime('%Y-%m-%d'),
+                'release_date': release_date.strftime('%Y-%m-%d') if release_date else None,
                 'released': element.get('released', None),
                 'platforms': element.get('platforms', None)
-                }
-            game_candidates.append(candidate)
+                })
 
         return game_candidates
 
 
-    def _search_wikidata(self, search_title: str) -> List[str]:
+    async def _search_wikidata(self, search_title: str) -> List[str]:
         """Searches Wikidata to get the entity codes of entities that match the search title."""
-        url = 'https://www.wikidata.org/w/api.php'
         params = {
             'action': 'query',
             'list': 'search',
@@ -106,9 +386,7 @@ class GameManager:
             'props': 'claims'
         }
 
-        response = httpx.get(url=url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = await get_json(self.api_url, params)
         codes = []
         for element in data['query']['search']:
             codes.append(element['title'])
@@ -133,48 +411,72 @@ class GameManager:
                         WHERE game_table.game_id = %s AND date_platform_table.release_id = %s
                         """
         select_values = (game_id, release_id)
-        await query_db_with_pool(self.pool, 'USE', 'USE game_db;')
         response = await query_db_with_pool(self.pool, 'SELECT', select_query, select_values)
 
         target_game = Game(**response[0])
         return target_game
 
 
-    async def _add_new_games(self, entity_codes: List[str]) -> None:
-        """Adds a new game into `game_db` and return it as Game.
-        
+    async def get_releases(self, keys: List[Tuple[int, int]]) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        """Reads releases along with the metadata and the scores of their games, all in one query.
+
+        The releases read recently are served from `release_cache`, and only the rest is read from game_db.
+
         Args:
-            new_game: a dictionary of a new game to be added into game_db.
-            for_prep: a flag to indicate whther it's for filling up game_db.
+            keys: the (game_id, release_id) of the releases to read.
 
         Returns:
-            An instance of Game of the new game.
+            a dictionary mapping each (game_id, release_id) found in game_db to its release.
         """
-        title = None
-        is_DLC = None
-        wikidata_code = None
-        aliases = None
-        genres = None
-        developers = None
-        publishers = None
-        dates_and_platforms = None
-        parent_id = 'N/A'
+        releases: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        missing_keys = []
+        for key in dict.fromkeys(keys):
+            release = self.release_cache.get(key)
+            if release is None:
+                missing_keys.append(key)
+            else:
+                releases[key] = release
+        if not missing_keys:
+            return releases
+
+        select_query = f"""
+                        SELECT game_table.game_id, title, is_DLC, aliases, wikidata_code, genres, developers, publishers,
+                               meta_critic_score, meta_user_score, open_critic_score, open_user_score,
+                               release_id, release_date, released, date_platform_table.platforms
+                        FROM game_table
+                        INNER JOIN date_platform_table
+                        ON game_table.game_id = date_platform_table.game_id
+                        WHERE (date_platform_table.game_id, date_platform_table.release_id) IN ({', '.join(['(%s, %s)'] * len(missing_keys))});"""
+        select_values = tuple(value for key in missing_keys for value in key)
+        response = await query_db_with_pool(self.pool, 'SELECT', select_query, select_values)
+        for element in response:
+            release_date = element.get('release_date', None)
+            release = {**element, 'release_date': release_date.strftime('%Y-%m-%d') if release_date else None}
+            key = (element['game_id'], element['release_id'])
+            self.release_cache.put(key, release)
+            releases[key] = release
+        return releases
+
 
+    async def _add_new_games(self, entity_codes: List[str]) -> int:
+        """Adds the games of the given entity codes from Wikidata into `game_db`.
+        
+        Args:
+            entity_codes: the Wikidata entity codes of the games to be added into game_db.
+
+        Returns:
+            The number of games that have been added.
+        """
         try:
-            for entity_code in entity_codes:
-                raw_metadata = self._get_metadata(code=entity_code, language='en')
+            new_games = []
+            metadata = await self._get_metadata(codes=entity_codes, language='en')
+            await self._learn_unknown_labels([raw_metadata for raw_metadata in metadata.values() if raw_metadata is not None], language='en')
+            for entity_code, raw_metadata in metadata.items():
                 if raw_metadata is None:
                     continue
                 processed_metadata = self._process_game_data_with_code(raw_metadata)
-
-                title = processed_metadata.get('title', None)
-                is_DLC = processed_metadata.get('is_DLC', None)
-                wikidata_code = entity_code
-                aliases = processed_metadata.get('aliases', None)
-                genres = processed_metadata.get('genres', None)
-                developers = processed_metadata.get('developers', None)
-                publishers = processed_metadata.get('publishers', None)
-                dates_and_platforms = processed_metadata.get('publication_dates', None)
+                processed_metadata['wikidata_code'] = entity_code
+                processed_metadata['parent_id'] = 'N/A'
 
                 # if is_DLC:
                 #     response = await self._search_game_db(title)
@@ -188,113 +490,231 @@ class GameManager:
                 #     developers += selected_parent.get('developers', '')
                 #     publishers += selected_parent.get('publishers', '')
 
-                # Sends query to `game_table` to add the new game.
-                query_insert_game = """
-                USE game_db;
-                INSERT INTO game_table 
-                (title, is_DLC, aliases, wikidata_code, genres, developers, publishers, parent_id)
-                VALUES(%s, %s, %s, %s, %s, %s, %s, %s);
-                """
-                value_insert_game = (title, is_DLC, aliases, wikidata_code, genres, developers, publishers, parent_id)
-                await query_db_with_pool(self.pool, 'INSERT', query_insert_game, value_insert_game)
-
-                # Sends query to retrieve `game_id`
-                game_id_response = await query_db_with_pool(self.pool, 'SELECT', 'SELECT LAST_INSERT_ID() AS game_id;')
-                game_id = game_id_response[0].get('game_id', None)
-
-                # Sends query to `release table` to add release data platforms and etc.
-                base_query = """
-                USE game_db;
-                INSERT INTO date_platform_table
-                (game_id, release_date, released, platforms)
-                """
-                complete_query = lambda base_query, length: base_query + "VALUE " + ", ".join(['(%s, %s, %s, %s)'] * length) + ';'
-                if dates_and_platforms:
-                    query_insert_data = complete_query(base_query, len(dates_and_platforms))
-                    value_insert_data = tuple()
-                    for element in dates_and_platforms:
-                        release_date = None
-                        released = 0
-                        try:
-                            release_date = datetime.strptime(element.get('publication_date', None), '%Y-%m-%d')
-                        except ValueError:
-                            release_date = None
-                        if release_date is not None:
-                                released = 1 if release_date <= datetime.today() else 0
-                        platforms = element.get('platforms', None)
-                        rel_date_str = datetime.strftime(release_date, "%Y-%m-%d") if release_date is not None else None
-                        value_insert_data += (game_id, rel_date_str, released, platforms)
-                    await query_db_with_pool(self.pool, 'INSERT', query_insert_data, value_insert_data)
-                # elif not for_prep and not dates_and_platforms and is_DLC:
-                #     query_insert_data = complete_query(base_query, 1)
-                #     parent_platforms = await query_db_with_pool(self.pool, 'SELECT', f'SELECT platforms FROM date_platform_table WHERE game_id = {parent_id} GROUP BY platforms')
-                #     platforms = ''
-                #     for element in parent_platforms:
-                #         platforms = platforms+ ', ' + element['platforms'] if platforms else element['platforms']
-                #     value_insert_data = (game_id, '2100-12-31', 0, platforms)
-                #     await query_db_with_pool(self.pool, 'INSERT', query_insert_data, value_insert_data)
-
-                print(f'{title} has been added into `game_db`.\n ---------------------------------------------')
+                new_games.append(processed_metadata)
+
+            added_games, existing_games = await self._insert_games(new_games)
+            # The games another process has inserted are indexed too, as this process has never seen them.
+            for game in added_games + existing_games:
+                self.search_index.add(game['game_id'], game.get('title', None), game.get('aliases', None))
+                self.suggest_index.add(game.get('title', None), game.get('aliases', None))
+            if added_games or existing_games:
+                # A new title may match any cached search, so the cached results are dropped all together.
+                self.search_cache.clear()
+                self.negative_cache.clear()
+            for game in added_games:
+                print(f'{game.get("title")} has been added into `game_db`.')
+            return len(added_games)
 
-        except IntegrityError as e:
-            print(f'IntegrityError has occurred : {title} is already present in game_db')
         except Exception as e:
             raise RuntimeError(f'Error occurred in `add_new_game()` | {e}') from e
 
 
-    def _get_metadata(self, code: str, language: str = 'en', filtering_platforms: List[str] = []) -> Dict:
-        """Retrieves metadata from Wikidata With the given entity code."""
-        url = 'https://www.wikidata.org/w/api.php'
+    async def _insert_games(self, games: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """Inserts a batch of processed games and their releases into `game_db` in a single transaction.
+
+        Games whose `wikidata_code` is already in `game_table` are skipped. Strings longer than their columns are cut
+        by `fit_column` beforehand, as MySQL in strict mode would otherwise roll the whole batch back. The games are written with
+        multi-row INSERTs of up to `INSERT_BATCH_SIZE` rows on one Connection and their releases with `executemany`.
+        The transaction is retried up to `INSERT_MAX_ATTEMPTS` times on a duplicate code, a deadlock or a lock wait timeout.
+
+        Args:
+            games: the games processed by `_process_game_data_with_code`, along with `wikidata_code` and `parent_id`.
+
+        Returns:
+            (the games that have been inserted, each with its new `game_id`,
+             the rows of the games that were already in `game_table`, with their `game_id`, `title`, `aliases` and `wikidata_code`)
+        """
+        unique_games = list({game['wikidata_code']: game for game in games}.values())
+        if not unique_games:
+            return [], []
+
+        # Retries in case a concurrent writer inserted one of the games between the SELECT and the INSERT, or deadlocked with this one.
+        for attempt in range(INSERT_MAX_ATTEMPTS):
+            try:
+                async with transaction_with_pool(self.pool) as db_cursor:
+                    codes = [game['wikidata_code'] for game in unique_games]
+                    await db_cursor.execute(f'SELECT game_id, title, aliases, wikidata_code FROM game_table WHERE wikidata_code IN ({", ".join(["%s"] * len(codes))});', codes)
+                    existing_games = list(await db_cursor.fetchall())
+                    existing_codes = {row['wikidata_code'] for row in existing_games}
+                    new_games = [{**game, **{column: fit_column(game.get(column, None), length) for column, length in GAME_COLUMN_LENGTHS.items() if column in game}}
+                                 for game in unique_games if game['wikidata_code'] not in existing_codes]
+
+                    release_values = []
+                    for start in range(0, len(new_games), INSERT_BATCH_SIZE):
+                        chunk = new_games[start:start + INSERT_BATCH_SIZE]
+                        query_insert_games = ('INSERT INTO game_table (title, is_DLC, aliases, wikidata_code, genres, developers, publishers, parent_id) VALUES '
+                                              + ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(chunk)) + ';')
+                        value_insert_games = tuple()
+                        for game in chunk:
+                            value_insert_games += (game.get('title', None), game.get('is_DLC', None), game.get('aliases', None), game.get('wikidata_code', None),
+                                                   game.get('genres', None), game.get('developers', None), game.get('publishers', None), game.get('parent_id', 'N/A'))
+                        await db_cursor.execute(query_insert_games, value_insert_games)
+
+                        # The IDs of a multi-row INSERT are not consecutive with `innodb_autoinc_lock_mode=2` under concurrent inserts
+                        # or with `auto_increment_increment > 1`, so they are read back by the unique `wikidata_code`.
+                        chunk_codes = [game['wikidata_code'] for game in chunk]
+                        await db_cursor.execute(f'SELECT game_id, wikidata_code FROM game_table WHERE wikidata_code IN ({", ".join(["%s"] * len(chunk_codes))});', chunk_codes)
+                        game_ids = {row['wikidata_code']: row['game_id'] for row in await db_cursor.fetchall()}
+                        for game in chunk:
+                            game['game_id'] = game_ids[game['wikidata_code']]
+                            release_values.extend(self._make_release_rows(game['game_id'], game.get('publication_dates', None)))
+
+                    if release_values:
+                        await db_cursor.executemany('INSERT INTO date_platform_table (game_id, release_date, released, platforms) VALUES (%s, %s, %s, %s);', release_values)
+                return new_games, existing_games
+
+            except IntegrityError as e:
+                if attempt == INSERT_MAX_ATTEMPTS - 1:
+                    raise IntegrityError(f'IntegrityError has occurred while inserting games. | {e}') from e
+                print(f'IntegrityError has occurred, retrying : {e}')
+            except OperationalError as e:
+                if e.args[0] not in RETRYABLE_MYSQL_ERRORS or attempt == INSERT_MAX_ATTEMPTS - 1:
+                    raise
+                print(f'OperationalError {e.args[0]} has occurred, retrying : {e}')
+
+
+    def _make_release_rows(self, game_id: int, dates_and_platforms: Optional[List[Dict]]) -> List[Tuple]:
+        """Makes the rows of `date_platform_table` for a game from its publication dates."""
+        release_rows = []
+        for element in dates_and_platforms or []:
+            release_date = None
+            released = 0
+            try:
+                release_date = datetime.strptime(element.get('publication_date', None), '%Y-%m-%d')
+            except (TypeError, ValueError):
+                release_date = None
+            if release_date is not None:
+                released = 1 if release_date <= datetime.today() else 0
+            platforms = fit_column(element.get('platforms', None), RELEASE_PLATFORMS_LENGTH)
+            rel_date_str = datetime.strftime(release_date, "%Y-%m-%d") if release_date is not None else None
+            release_rows.append((game_id, rel_date_str, released, platforms))
+        # elif not for_prep and not dates_and_platforms and is_DLC:
+        #     parent_platforms = await query_db_with_pool(self.pool, 'SELECT', f'SELECT platforms FROM date_platform_table WHERE game_id = {parent_id} GROUP BY platforms')
+        #     platforms = ''
+        #     for element in parent_platforms:
+        #         platforms = platforms+ ', ' + element['platforms'] if platforms else element['platforms']
+        #     release_rows.append((game_id, '2100-12-31', 0, platforms))
+        return release_rows
+
+
+    async def _get_metadata(self, codes: List[str], language: str = 'en', filtering_platforms: List[str] = []) -> Dict[str, Optional[Dict]]:
+        """Retrieves metadata from Wikidata with the given entity codes in batches.
+
+        The raw entities are looked up in `entity_store` first. Stored entities older than `ENTITY_STORE_MAX_AGE`
+        are revalidated by comparing their `lastrevid` with Wikidata and downloaded again only if they changed.
+        The rest is downloaded in chunks of `WIKIDATA_MAX_IDS` codes, the limit of `wbgetentities`, requested concurrently.
+        In offline mode, only the stored entities are used whatever their age.
+
+        Args:
+            codes: the entity codes to retrieve metadata for.
+            language: the language of labels and aliases.
+            filtering_platforms: the platform codes that at least one of which a game must be on.
+
+        Returns:
+            a dictionary mapping each entity code to its metadata, or to None if it's not a game to be added.
+        """
+        unique_codes = list(dict.fromkeys(codes))
+        entities = await self._get_raw_entities(unique_codes, language)
+
+        metadata = {code: None for code in unique_codes}
+        for code, entity in entities.items():
+            if code in metadata:
+                metadata[code] = self._parse_entity(entity, language, filtering_platforms)
+        return metadata
+
+
+    async def _get_raw_entities(self, codes: List[str], language: str) -> Dict[str, Dict]:
+        """Retrieves the raw entities from `entity_store` or Wikidata, storing the downloaded ones."""
+        stored = self.entity_store.get_many(codes, language)
+        if self.offline:
+            return {code: entity for code, (_, _, entity) in stored.items()}
+
+        now = time.time()
+        entities = {code: entity for code, (_, fetched_at, entity) in stored.items() if now - fetched_at < ENTITY_STORE_MAX_AGE}
+        stale_revisions = {code: lastrevid for code, (lastrevid, fetched_at, _) in stored.items() if code not in entities}
+        codes_to_fetch = [code for code in codes if code not in stored]
+
+        if stale_revisions:
+            current_revisions = await self._get_revisions(list(stale_revisions), language)
+            unchanged_codes = [code for code, lastrevid in stale_revisions.items() if lastrevid is not None and current_revisions.get(code) == lastrevid]
+            self.entity_store.touch(unchanged_codes, language)
+            entities.update({code: stored[code][2] for code in unchanged_codes})
+            codes_to_fetch.extend(code for code in stale_revisions if code not in unchanged_codes)
+
+        if codes_to_fetch:
+            chunks = [codes_to_fetch[i:i + WIKIDATA_MAX_IDS] for i in range(0, len(codes_to_fetch), WIKIDATA_MAX_IDS)]
+            responses = await asyncio.gather(*(self._get_entities(chunk, language) for chunk in chunks))
+            fetched = {code: entity for response in responses for code, entity in response.items() if 'missing' not in entity}
+            self.entity_store.put_many(fetched, language)
+            entities.update(fetched)
+        return entities
+
+
+    async def _get_entities(self, codes: List[str], language: str, props: str = 'info|labels|aliases|claims') -> Dict[str, Dict]:
+        """Sends a single `wbgetentities` request for up to `WIKIDATA_MAX_IDS` entity codes."""
         params = {
             'action': 'wbgetentities',
-            'ids': code,
+            'ids': '|'.join(codes),
             'languages': language,
             'format': 'json',
-            'props': 'labels|aliases|claims'
+            'props': props
         }
 
-        response = httpx.get(url=url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = await get_json(self.api_url, params)
+        return data.get('entities', {})
+
+
+    async def _get_revisions(self, codes: List[str], language: str) -> Dict[str, int]:
+        """Retrieves only the `lastrevid` of the entities, which is much lighter than their claims."""
+        chunks = [codes[i:i + WIKIDATA_MAX_IDS] for i in range(0, len(codes), WIKIDATA_MAX_IDS)]
+        responses = await asyncio.gather(*(self._get_entities(chunk, language, props='info') for chunk in chunks))
+        return {code: entity.get('lastrevid') for response in responses for code, entity in response.items()}
+
+
+    def _parse_entity(self, entity: Dict, language: str = 'en', filtering_platforms: List[str] = []) -> Optional[Dict]:
+        """Extracts the metadata of a game from the raw JSON of a Wikidata entity.
+
+        Returns:
+            the metadata with Wikidata codes, or None if the entity is not a game or not on the filtering platforms.
+        """
         processed_data = {}
-        for entity in data['entities'].values():
-            if (not entity.get('claims', {}) or
-                not entity.get('claims').get('P31', []) or
-                not any(instance.get('mainsnak', {}).get('datavalue').get('value', {})['id'] in ('Q7889', 'Q1066707', 'Q209163')for instance in entity.get('claims', {}).get('P31'))):
-                return
-            processed_data['platforms'] = [platform.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id', 'N/A') for platform in entity.get('claims', {}).get('P400', {})]
-
-            # filtering for specific platform
-            if filtering_platforms and not any(platform in filtering_platforms for platform in processed_data['platforms']):
-                return
-            processed_data['title'] = entity.get('labels', {}).get(language, {}).get('value', 'N/A')
-            processed_data['aliases'] = [alias.get('value', 'N/A') for alias in entity.get('aliases', {}).get(language, {})]
-            processed_data['wikidata_code'] = entity.get('id', 'N/A')
-            processed_data['is_DLC'] = True if entity.get('claims', {}).get('P31', [])[0].get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id', 'N/A') in ('Q1066707', 'Q209163') else False
-            processed_data['genres'] = [genre.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id', 'N/A') for genre in entity.get('claims', {}).get('P136', {})]
-            processed_data['developers'] = [developer.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id', 'N/A') for developer in entity.get('claims', {}).get('P178', {})]
-            processed_data['publishers'] = [publisher.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id', 'N/A') for publisher in entity.get('claims', {}).get('P123', {})]
-            processed_data['publication_dates'] = []
-            for date_node in entity.get('claims', {}).get('P577', {}):
-                skip_outer = False
-                temp = {}
-                temp['publication_date'] = date_node.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('time', 'N/A')
-                temp['platforms'] = ''
-                for qualifier_code, qualifier_node in date_node.get('qualifiers', {}).items():
-                    # in case of delayed
-                    if qualifier_code == 'P2241':
-                        skip_outer = True
-                        break
-                    if qualifier_code == 'P400':
-                        temp['platforms'] = [platform_node.get('datavalue', {}).get('value', {}).get('id', 'N/A') for platform_node in qualifier_node]
-                    if not temp['platforms']:
-                        temp['platforms'] = processed_data['platforms']
-                if skip_outer:
-                    continue
-                # in case no platforms mentioned
+        if (not entity.get('claims', {}) or
+            not entity.get('claims').get('P31', []) or
+            not any(instance.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id') in ('Q7889', 'Q1066707', 'Q209163') for instance in entity.get('claims', {}).get('P31'))):
+            return None
+        processed_data['platforms'] = [platform.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id', 'N/A') for platform in entity.get('claims', {}).get('P400', {})]
+
+        # filtering for specific platform
+        if filtering_platforms and not any(platform in filtering_platforms for platform in processed_data['platforms']):
+            return None
+        processed_data['title'] = entity.get('labels', {}).get(language, {}).get('value', 'N/A')
+        processed_data['aliases'] = [alias.get('value', 'N/A') for alias in entity.get('aliases', {}).get(language, {})]
+        processed_data['wikidata_code'] = entity.get('id', 'N/A')
+        processed_data['is_DLC'] = True if entity.get('claims', {}).get('P31', [])[0].get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id', 'N/A') in ('Q1066707', 'Q209163') else False
+        processed_data['genres'] = [genre.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id', 'N/A') for genre in entity.get('claims', {}).get('P136', {})]
+        processed_data['developers'] = [developer.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id', 'N/A') for developer in entity.get('claims', {}).get('P178', {})]
+        processed_data['publishers'] = [publisher.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('id', 'N/A') for publisher in entity.get('claims', {}).get('P123', {})]
+        processed_data['publication_dates'] = []
+        for date_node in entity.get('claims', {}).get('P577', {}):
+            skip_outer = False
+            temp = {}
+            temp['publication_date'] = date_node.get('mainsnak', {}).get('datavalue', {}).get('value', {}).get('time', 'N/A')
+            temp['platforms'] = ''
+            for qualifier_code, qualifier_node in date_node.get('qualifiers', {}).items():
+                # in case of delayed
+                if qualifier_code == 'P2241':
+                    skip_outer = True
+                    break
+                if qualifier_code == 'P400':
+                    temp['platforms'] = [platform_node.get('datavalue', {}).get('value', {}).get('id', 'N/A') for platform_node in qualifier_node]
                 if not temp['platforms']:
-                    temp.update({'platforms': processed_data['platforms']})
-                processed_data['publication_dates'].append(temp)
+                    temp['platforms'] = processed_data['platforms']
+            if skip_outer:
+                continue
+            # in case no platforms mentioned
+            if not temp['platforms']:
+                temp.update({'platforms': processed_data['platforms']})
+            processed_data['publication_dates'].append(temp)
         return processed_data
 
 
@@ -319,13 +739,57 @@ class GameManager:
 
 
     def _replace_code(self, property_name: str, codes: str) -> str:
-        """Finds and replcaes codes with actual values."""
-        values = []
-        for code in codes:
-            value = self.properties[property_name].get(code, 'N/A')
-            values.append(value)
+        """Finds and replcaes codes with actual values, falling back to the labels learned from Wikidata."""
+        values = self.property_index.lookup(property_name, codes)
+        unknown_codes = [code for code, value in zip(codes, values) if value is None]
+        learned = self.learned_labels.lookup(unknown_codes)
+
+        self.label_stats['index_hits'] += len(codes) - len(unknown_codes)
+        self.label_stats['learned_hits'] += len(learned)
+        self.label_stats['misses'] += len(unknown_codes) - len(learned)
+
+        return ', '.join(value if value is not None else learned.get(code, 'N/A') for code, value in zip(codes, values))
+
 
-        return ', '.join(values)
+    async def _learn_unknown_labels(self, raw_metadata_list: List[Dict], language: str = 'en') -> None:
+        """Learns the labels of every code in a batch of metadata that is neither in `property_index` nor learned yet.
+
+        The unknown codes of the whole batch are resolved by one labels-only `wbgetentities` request per
+        `WIKIDATA_MAX_IDS` codes, instead of one request per entity.
+        """
+        codes_by_property: Dict[str, set] = {}
+        for raw_metadata in raw_metadata_list:
+            for property_name in ('genres', 'developers', 'publishers', 'platforms'):
+                codes_by_property.setdefault(property_name, set()).update(raw_metadata.get(property_name, []))
+            for date_platform in raw_metadata.get('publication_dates', []):
+                codes_by_property.setdefault('platforms', set()).update(date_platform.get('platforms', []))
+
+        unknown_codes = set()
+        for property_name, codes in codes_by_property.items():
+            codes = [code for code in codes if code != 'N/A']
+            unknown_codes.update(code for code, value in zip(codes, self.property_index.lookup(property_name, codes)) if value is None)
+        unknown_codes -= set(self.learned_labels.lookup(list(unknown_codes)))
+        if not unknown_codes or self.offline:
+            return
+
+        codes = sorted(unknown_codes)
+        chunks = [codes[i:i + WIKIDATA_MAX_IDS] for i in range(0, len(codes), WIKIDATA_MAX_IDS)]
+        responses = await asyncio.gather(*(self._get_entities(chunk, language, props='labels') for chunk in chunks))
+        # Codes without a label are learned as 'N/A' so that they are not requested again.
+        labels = {code: entity.get('labels', {}).get(language, {}).get('value', 'N/A') for response in responses for code, entity in response.items()}
+        self.learned_labels.learn(labels)
+        self.label_stats['learned'] += len(labels)
+        self.label_stats['requests'] += len(chunks)
+
+
+    def label_hit_rates(self) -> Dict[str, float]:
+        """Returns the share of codes resolved by `property_index`, by the learned labels, and by neither."""
+        total = self.label_stats['index_hits'] + self.label_stats['learned_hits'] + self.label_stats['misses']
+        if not total:
+            return {'index': 0.0, 'learned': 0.0, 'missed': 0.0}
+        return {'index': self.label_stats['index_hits'] / total,
+                'learned': self.label_stats['learned_hits'] / total,
+                'missed': self.label_stats['misses'] / total}
 
 
     def _process_release_date(self, release_date: Optional[str]) -> str:
@@ -354,24 +818,7 @@ class GameManager:
             return release_date
 
 
-    def _load_json_for_properties(self, json_path: str):
-        """Loads the property data from `wikidata_properties.json` file."""
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        properties = {}
-
-        for property_name in data:
-            temp = {}
-            for element in data[property_name]:
-                temp[element['code']] = element['label']
-            properties[property_name] = temp
-
-        return properties
-    
-
-    def _make_candidate_list_wikidata_old(self, wikidata_codes: List[str], language: str = 'en') -> List[Dict[str, str]]:
-        url = 'https://www.wikidata.org/w/api.php'
+    async def _make_candidate_list_wikidata_old(self, wikidata_codes: List[str], language: str = 'en') -> List[Dict[str, str]]:
         codes = '|'.join(wikidata_codes)
         params = {
             'action': 'wbgetentities',
@@ -380,9 +827,7 @@ class GameManager:
             'format': 'json',
             'props': 'labels|claims'
         }
-        response = httpx.get(url=url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = await get_json(self.api_url, params)
         # title, wikidata link, platform need to be displayed
         game_candidates: List[Dict[str, Any]] = []
         for code, entity in data.get('entities', {}).items():
@@ -488,8 +933,8 @@ class GameManager:
 
             # Fall back to Wikidata
             print(f'The game, {search_title} was not found in game_db, trying in Wikidata')
-            wikidata_codes = self._search_wikidata(search_title)
-            candidates_from_wikidata = self._make_candidate_list_wikidata_old(wikidata_codes)
+            wikidata_codes = await self._search_wikidata(search_title)
+            candidates_from_wikidata = await self._make_candidate_list_wikidata_old(wikidata_codes)
 
             if candidates_from_wikidata:
                 selected_candidate = self._display_game_candidates(search_keyword=search_title, game_candidates=candidates_from_wikidata, data_source='wikidata', for_prep=for_prep)
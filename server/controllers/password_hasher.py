@@ -0,0 +1,131 @@
+"""Runs bcrypt on a bounded pool of threads, off the threads serving requests."""
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+from typing import Dict, Optional, Union
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12)) # the cost factor of new hashes, each step doubling the work
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', os.cpu_count() or 4)) # bcrypt releases the GIL, so threads run in parallel
+PASSWORD_MAX_PENDING = int(os.getenv('PASSWORD_MAX_PENDING', 64)) # the number of hashes queued or running before refusing more
+PASSWORD_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_QUEUE_TIMEOUT', 5.0)) # seconds to wait for room in the queue
+PASSWORD_STATS_INTERVAL = float(os.getenv('PASSWORD_STATS_INTERVAL', 300)) # seconds between logs of `stats`, 0 to turn them off
+
+
+def get_rounds(hashed_password: bytes) -> int:
+    """Reads the cost factor out of a bcrypt hash such as `$2b$12$...`."""
+    return int(hashed_password.split(b'$')[2])
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a dedicated thread pool with a bounded queue.
+
+    The pool caps the bcrypt work running at once to `workers`, so a login burst can't starve the CPU.
+    The request threads still wait for their hashes, and once `max_pending` hashes are queued or running,
+    further logins are refused after `PASSWORD_QUEUE_TIMEOUT` instead of piling up.
+    """
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING):
+        self.rounds = rounds
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self.pending = 0 # queued or running
+        self.peak_pending = 0
+        self.completed = 0 # succeeded
+        self.rejected = 0
+        self.wait_seconds = 0.0 # in the queue, summed over the completed hashes
+        self.hash_seconds = 0.0 # running bcrypt, summed over the completed hashes
+        self._reporter: Optional[threading.Thread] = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+
+    def _run(self, function, *args):
+        """Runs a function on the pool and waits for its result, refusing if the queue stays full."""
+        if not self._slots.acquire(timeout=PASSWORD_QUEUE_TIMEOUT):
+            with self._lock:
+                self.rejected += 1
+            raise RuntimeError('Too many logins are in progress, please try again.')
+        with self._lock:
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        submitted = time.perf_counter()
+        timings = {}
+
+        def timed():
+            timings['started'] = time.perf_counter()
+            return function(*args)
+
+        try:
+            result = self.executor.submit(timed).result()
+            finished = time.perf_counter()
+            with self._lock:
+                self.completed += 1
+                self.wait_seconds += timings['started'] - submitted
+                self.hash_seconds += finished - timings['started']
+            return result
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+
+
+    def hash(self, password: str) -> bytes:
+        """Hashes a password with the configured cost factor."""
+        return self._run(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds)))
+
+
+    def verify(self, password: str, hashed_password: bytes) -> bool:
+        """Checks a password against its hash."""
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed_password)
+
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        """Checks if a hash was made with a cost factor other than the configured one."""
+        return get_rounds(hashed_password) != self.rounds
+
+
+    def queue_depth(self) -> int:
+        """The number of hashes waiting for a free worker."""
+        with self._lock:
+            return max(self.pending - self.workers, 0)
+
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """The current queue depth and the counters and mean timings since the start, in milliseconds."""
+        with self._lock:
+            return {'pending': self.pending, 'queue_depth': max(self.pending - self.workers, 0), 'peak_pending': self.peak_pending,
+                    'completed': self.completed, 'rejected': self.rejected,
+                    'mean_wait_ms': self.wait_seconds / self.completed * 1000 if self.completed else 0.0,
+                    'mean_hash_ms': self.hash_seconds / self.completed * 1000 if self.completed else 0.0}
+
+
+    def format_stats(self) -> str:
+        """Formats `stats` into one line for the logs."""
+        return ' | '.join(f'{key}: {value:.1f}' if isinstance(value, float) else f'{key}: {value}' for key, value in self.stats().items())
+
+
+    def start_reporting(self, interval: float = PASSWORD_STATS_INTERVAL) -> None:
+        """Prints `stats` every `interval` seconds on a daemon thread, skipping the intervals without any hash."""
+        if interval <= 0 or self._reporter is not None:
+            return
+
+        def report():
+            last_counts = (0, 0)
+            while True:
+                time.sleep(interval)
+                stats = self.stats()
+                counts = (stats['completed'], stats['rejected'])
+                if counts != last_counts:
+                    print(f'Password hasher | {self.format_stats()}')
+                    last_counts = counts
+
+        self._reporter = threading.Thread(target=report, name='password-hasher-stats', daemon=True)
+        self._reporter.start()
+
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+PASSWORD_HASHER = PasswordHasher()
@@ -0,0 +1,116 @@
+"""Holds an in-memory inverted index of game titles to rank games without querying MySQL."""
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from server.controllers.cache import normalize_key
+
+NGRAM_SIZE = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Results scoring below this share of the best score are dropped, like the relevance cutoff of the FULLTEXT search.
+SEARCH_MIN_RELATIVE_SCORE = float(os.getenv('SEARCH_MIN_RELATIVE_SCORE', 0.5))
+# N-grams found in more than this share of the games, e.g. `#of`, carry little information and are skipped at query time.
+NGRAM_MAX_DOCUMENT_RATIO = 0.05
+
+token_pattern = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits a text into case-folded word tokens."""
+    return token_pattern.findall(normalize_key(text))
+
+
+def make_terms(text: str) -> List[str]:
+    """Makes the index terms of a text: its word tokens and the character n-grams of each token.
+
+    Tokens are kept whatever their length, so short titles such as `Ico` or `Rez` are still found,
+    and the n-grams let a partial or misspelled word match.
+    """
+    terms = []
+    for token in tokenize(text):
+        terms.append(f'w:{token}')
+        padded = f'#{token}#'
+        terms.extend(f'g:{padded[i:i + NGRAM_SIZE]}' for i in range(len(padded) - NGRAM_SIZE + 1))
+    return terms
+
+
+class SearchIndex:
+    """An inverted index over the title and the aliases of each game, ranked with BM25.
+
+    It's built from `game_table` at startup and updated whenever games are inserted.
+    """
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {} # term -> {game_id: term frequency}
+        self.document_lengths: Dict[int, int] = {}
+        self.document_terms: Dict[int, Tuple[str, ...]] = {} # game_id -> its distinct terms, to remove it again
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        return len(self.document_lengths)
+
+
+    def add(self, game_id: int, title: str, aliases: Optional[str] = None) -> None:
+        """Indexes a game by its title and aliases, replacing it if it's already indexed."""
+        terms = make_terms(f'{title or ""} {aliases or ""}')
+        with self._lock:
+            if game_id in self.document_lengths:
+                self._remove(game_id)
+            for term in terms:
+                frequencies = self.postings.setdefault(term, {})
+                frequencies[game_id] = frequencies.get(game_id, 0) + 1
+            self.document_lengths[game_id] = len(terms)
+            self.document_terms[game_id] = tuple(set(terms))
+            self.total_length += len(terms)
+
+
+    def _remove(self, game_id: int) -> None:
+        """Removes a game from the postings. The lock must be held."""
+        for term in self.document_terms.pop(game_id):
+            del self.postings[term][game_id]
+            if not self.postings[term]:
+                del self.postings[term]
+        self.total_length -= self.document_lengths.pop(game_id)
+
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Ranks the games matching the query.
+
+        Args:
+            query: the user's input for the game title to search for.
+            limit: the maximum number of games to return.
+
+        Returns:
+            a list of (game_id, score) sorted by descending score, then by ascending game_id.
+        """
+        query_terms: Dict[str, int] = {}
+        for term in make_terms(query):
+            query_terms[term] = query_terms.get(term, 0) + 1
+
+        scores: Dict[int, float] = {}
+        with self._lock:
+            document_count = len(self.document_lengths)
+            if not document_count:
+                return []
+            length_factor = BM25_K1 * BM25_B * document_count / self.total_length
+            base_norm = BM25_K1 * (1 - BM25_B)
+            document_lengths = self.document_lengths
+            for term, query_frequency in query_terms.items():
+                frequencies = self.postings.get(term)
+                if not frequencies:
+                    continue
+                if term.startswith('g:') and len(frequencies) > document_count * NGRAM_MAX_DOCUMENT_RATIO:
+                    continue
+                weight = query_frequency * (BM25_K1 + 1) * math.log(1 + (document_count - len(frequencies) + 0.5) / (len(frequencies) + 0.5))
+                for game_id, frequency in frequencies.items():
+                    norm = base_norm + length_factor * document_lengths[game_id]
+                    scores[game_id] = scores.get(game_id, 0.0) + weight * frequency / (frequency + norm)
+
+        if not scores:
+            return []
+        threshold = max(scores.values()) * SEARCH_MIN_RELATIVE_SCORE
+        ranked = sorted(((game_id, score) for game_id, score in scores.items() if score >= threshold), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
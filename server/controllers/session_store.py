@@ -0,0 +1,166 @@
+"""Holds the server-side session backends, loading a session only when a view touches it."""
+from datetime import datetime, timedelta, timezone
+import os
+import secrets
+from typing import Any, Dict, Iterator, Optional
+from flask.sessions import SessionInterface, SessionMixin
+import pymongo
+from server.controllers.cache import TTLCache
+from server.models.mongodb import connect_mongodb
+
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'mongodb') # one of `mongodb`, `memory` or `filesystem`
+SESSION_MEMORY_SIZE = int(os.getenv('SESSION_MEMORY_SIZE', 10000)) # the number of sessions kept by the memory backend
+# Keys that Flask-Login sets and pops within one request, so a session that hasn't been loaded can't hold them.
+# Flask-Login checks `'_remember' in session` after every request, which would otherwise load every session.
+REQUEST_ONLY_KEYS = frozenset({'_remember'})
+
+
+class MemorySessionStore:
+    """Keeps the sessions in this process, evicting the least recently used ones. Only for a single node."""
+    def __init__(self, maxsize: int = SESSION_MEMORY_SIZE):
+        self.cache = TTLCache(maxsize=maxsize)
+
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        data = self.cache.get(sid)
+        return dict(data) if data is not None else None # a copy, as concurrent requests may share the session
+
+
+    def put(self, sid: str, data: Dict[str, Any], ttl: float) -> None:
+        self.cache.put(sid, data, ttl=ttl)
+
+
+    def delete(self, sid: str) -> None:
+        self.cache.pop(sid)
+
+
+class MongoSessionStore:
+    """Keeps the sessions in the `sessions` database, shared by every node.
+
+    A TTL index on `expires_at` lets MongoDB delete the expired sessions by itself.
+    """
+    def __init__(self, collection=None):
+        self.collection = collection if collection is not None else connect_mongodb('sessions').sessions
+        self.collection.create_index([('expires_at', pymongo.ASCENDING)], expireAfterSeconds=0, name='expires_at_ttl')
+
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        # The TTL monitor runs once a minute, so sessions that expired in between are filtered out here.
+        document = self.collection.find_one({'_id': sid, 'expires_at': {'$gt': datetime.now(timezone.utc)}}, {'data': 1})
+        return document['data'] if document else None
+
+
+    def put(self, sid: str, data: Dict[str, Any], ttl: float) -> None:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        self.collection.replace_one({'_id': sid}, {'_id': sid, 'data': data, 'expires_at': expires_at}, upsert=True)
+
+
+    def delete(self, sid: str) -> None:
+        self.collection.delete_one({'_id': sid})
+
+
+class LazySession(SessionMixin):
+    """A session that reads its data from the store on the first access instead of at the start of every request."""
+    def __init__(self, store, sid: Optional[str]):
+        self.store = store
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self._data: Optional[Dict[str, Any]] = None
+
+
+    def _load(self) -> Dict[str, Any]:
+        self.accessed = True
+        if self._data is None:
+            data = self.store.get(self.sid) if self.sid else None
+            if data is None:
+                # An unknown or expired id from the cookie is never reused, so that a client cannot pick its session id.
+                self.sid = None
+            self._data = data or {}
+        return self._data
+
+
+    def __getitem__(self, key: str) -> Any:
+        return self._load()[key]
+
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._load()[key] = value
+        self.modified = True
+
+
+    def __delitem__(self, key: str) -> None:
+        del self._load()[key]
+        self.modified = True
+
+
+    def __contains__(self, key: object) -> bool:
+        if self._data is None and key in REQUEST_ONLY_KEYS:
+            return False
+        return key in self._load()
+
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+
+    def regenerate(self) -> None:
+        """Moves the data under a new session id when the user logs in, so that an id known before the login can't be used after it."""
+        data = self._load()
+        if self.sid:
+            self.store.delete(self.sid)
+        self.sid = None
+        self._data = data
+        self.modified = True
+
+
+class StoreSessionInterface(SessionInterface):
+    """Keeps only a random session id in the cookie and the session data in a store.
+
+    The store is never queried for requests that don't touch the session, e.g. static files,
+    and is written only when the session has been modified.
+    """
+    def __init__(self, store):
+        self.store = store
+
+
+    def open_session(self, app, request) -> LazySession:
+        return LazySession(self.store, request.cookies.get(self.get_cookie_name(app)) or None)
+
+
+    def save_session(self, app, session: LazySession, response) -> None:
+        if not session.accessed:
+            return
+        response.vary.add('Cookie')
+        if not session.modified:
+            return
+
+        cookie_name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.sid:
+                self.store.delete(session.sid)
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        self.store.put(session.sid, dict(session), app.permanent_session_lifetime.total_seconds())
+        response.set_cookie(cookie_name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+
+def make_session_interface(backend: str = SESSION_BACKEND) -> StoreSessionInterface:
+    """Makes the session interface of a backend, `mongodb` or `memory`."""
+    if backend == 'mongodb':
+        return StoreSessionInterface(MongoSessionStore())
+    if backend == 'memory':
+        return StoreSessionInterface(MemorySessionStore())
+    raise ValueError(f'Unknown session backend: {backend}')
@@ -0,0 +1,180 @@
+"""Holds a prefix trie of game titles to suggest titles while the user types."""
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from server.controllers.search_index import tokenize
+
+SUGGEST_TOP_K = 10 # the number of best completions kept per node
+SUGGEST_MAX_EDITS = int(os.getenv('SUGGEST_MAX_EDITS', 2))
+SUGGEST_MAX_KEY_LENGTH = 24 # longer keys are cut since nobody types that far before picking a suggestion
+
+
+class _Node:
+    """A node of the trie with its outgoing edges and the best completions of its subtree."""
+    __slots__ = ('edges', 'top')
+
+    def __init__(self, top: Optional[List[int]] = None):
+        self.edges: Dict[str, Tuple[str, '_Node']] = {} # first character -> (edge label, child)
+        self.top: List[int] = top or [] # indexes into `TitleTrie.titles`, best first
+
+
+class TitleTrie:
+    """A path-compressed trie over titles and aliases, matching prefixes within a bounded edit distance.
+
+    Each title is inserted from the start of every word so that `spider` finds `Marvel Spider-Man 2`,
+    and every node keeps the `SUGGEST_TOP_K` shortest titles below it so that a lookup never walks a whole subtree.
+    """
+    def __init__(self):
+        self.root = _Node()
+        self.titles: List[str] = []
+        self.title_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+
+    def add(self, title: str, aliases: Optional[str] = None) -> None:
+        """Inserts a title, searchable by itself and by its comma-separated aliases."""
+        if not title:
+            return
+        with self._lock:
+            title_id = self.title_ids.get(title)
+            if title_id is None:
+                title_id = len(self.titles)
+                self.titles.append(title)
+                self.title_ids[title] = title_id
+            names = [title] + [alias for alias in (aliases or '').split(', ') if alias]
+            for name in names:
+                tokens = tokenize(name)
+                for start in range(len(tokens)):
+                    self._insert(' '.join(tokens[start:])[:SUGGEST_MAX_KEY_LENGTH], title_id)
+
+
+    def _rank(self, title_id: int) -> Tuple[int, str]:
+        return (len(self.titles[title_id]), self.titles[title_id])
+
+
+    def _offer(self, node: _Node, title_id: int) -> None:
+        """Adds a title to the best completions of a node if it ranks high enough."""
+        if title_id in node.top:
+            return
+        if len(node.top) >= SUGGEST_TOP_K and self._rank(title_id) >= self._rank(node.top[-1]):
+            return
+        node.top.append(title_id)
+        node.top.sort(key=self._rank)
+        del node.top[SUGGEST_TOP_K:]
+
+
+    def _insert(self, key: str, title_id: int) -> None:
+        """Inserts a key, splitting an edge where the key diverges from it. The lock must be held."""
+        node = self.root
+        self._offer(node, title_id)
+        while key:
+            edge = node.edges.get(key[0])
+            if edge is None:
+                node.edges[key[0]] = (key, _Node([title_id]))
+                return
+            label, child = edge
+            common = 0
+            while common < len(label) and common < len(key) and label[common] == key[common]:
+                common += 1
+            if common < len(label):
+                middle = _Node(list(child.top))
+                middle.edges[label[common]] = (label[common:], child)
+                node.edges[key[0]] = (label[:common], middle)
+                child = middle
+            node = child
+            self._offer(node, title_id)
+            key = key[common:]
+
+
+    def suggest(self, prefix: str, limit: int = SUGGEST_TOP_K) -> List[str]:
+        """Finds the titles having a word that starts with the prefix, allowing a few typos.
+
+        The allowed edit distance grows with the length of the prefix up to `SUGGEST_MAX_EDITS`,
+        and exact prefix matches come before fuzzy ones.
+
+        Args:
+            prefix: what the user has typed so far.
+            limit: the maximum number of titles to return.
+
+        Returns:
+            the suggested titles, best first.
+        """
+        query = ' '.join(tokenize(prefix))[:SUGGEST_MAX_KEY_LENGTH]
+        if not query:
+            return []
+
+        with self._lock:
+            # An exact prefix match is a single walk down the trie, which is enough most of the time.
+            exact = self._walk(query)
+            if exact is not None and len(exact.top) >= limit:
+                return [self.titles[title_id] for title_id in exact.top[:limit]]
+
+            max_edits = min(SUGGEST_MAX_EDITS, len(query) // 4)
+            distances = self._fuzzy_match(query, max_edits)
+            ranked = sorted(distances, key=lambda title_id: (distances[title_id], *self._rank(title_id)))
+            return [self.titles[title_id] for title_id in ranked[:limit]]
+
+
+    def _walk(self, key: str) -> Optional[_Node]:
+        """Finds the node below which every key starts with the given key. The lock must be held."""
+        node = self.root
+        while key:
+            edge = node.edges.get(key[0])
+            if edge is None:
+                return None
+            label, child = edge
+            if key.startswith(label):
+                key = key[len(label):]
+            elif label.startswith(key):
+                key = ''
+            else:
+                return None
+            node = child
+        return node
+
+
+    def _fuzzy_match(self, query: str, max_edits: int) -> Dict[int, int]:
+        """Finds the titles having a key whose prefix is within `max_edits` of the query. The lock must be held.
+
+        It walks the trie computing a row of the Levenshtein matrix per character, limited to the band of
+        columns within `max_edits` of the depth, and prunes a branch once every cell of the band exceeds `max_edits`.
+        The first character has to match exactly, as typos there are rare and it cuts most of the trie off.
+
+        Returns:
+            a dictionary mapping each matched title to its smallest edit distance.
+        """
+        length = len(query)
+        too_far = max_edits + 1
+        distances: Dict[int, int] = {}
+
+        def collect(node: _Node, distance: int):
+            for title_id in node.top:
+                if distance < distances.get(title_id, too_far):
+                    distances[title_id] = distance
+
+        stack = [(self.root, 0, [min(column, too_far) for column in range(length + 1)])]
+        while stack:
+            node, depth, row = stack.pop()
+            edges = node.edges.values() if node is not self.root else [node.edges[query[0]]] if query[0] in node.edges else []
+            for label, child in edges:
+                edge_depth = depth
+                edge_row = row
+                for character in label:
+                    edge_depth += 1
+                    new_row = [too_far] * (length + 1)
+                    new_row[0] = min(edge_depth, too_far)
+                    best = new_row[0]
+                    for column in range(max(1, edge_depth - max_edits), min(length, edge_depth + max_edits) + 1):
+                        cost = 0 if query[column - 1] == character else 1
+                        value = min(new_row[column - 1] + 1, edge_row[column] + 1, edge_row[column - 1] + cost, too_far)
+                        new_row[column] = value
+                        if value < best:
+                            best = value
+                    edge_row = new_row
+                    if edge_row[length] <= max_edits:
+                        collect(child, edge_row[length])
+                    if best > max_edits:
+                        break
+                else:
+                    stack.append((child, edge_depth, edge_row))
+        return distances
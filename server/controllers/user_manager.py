@@ -1,25 +1,45 @@
-import bcrypt
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
+from datetime import datetime, timezone
 from flask_login import UserMixin
-from server.models.game import Game
+from pymongo.errors import DuplicateKeyError
+import os
+from server.controllers.cache import TTLCache
+from server.controllers.password_hasher import PASSWORD_HASHER
 from server.models.mongodb import connect_mongodb
-from typing import List
+from typing import Any, Dict, Optional
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 4096)) # the number of users kept in memory
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30)) # seconds
+IDENTITY_PROJECTION = {'_id': 1, 'user_email': 1} # the fields needed to authenticate a request
+GAME_LIST_PAGE_SIZE = int(os.getenv('GAME_LIST_PAGE_SIZE', 50)) # the number of games per page of a user's game list
+USER_GAME_FIELDS = ('purchased', 'purchase_date', 'playing_platform', 'expectation_level') # the user's own answers about a game
+
+# The users loaded recently, as {user_id: {'user_email': ...}}, so that `load_user` does not query MongoDB on every request.
+USER_CACHE = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
 
 
 class User(UserMixin):
-    def __init__(self, user_id, user_email, game_list):
+    def __init__(self, user_id, user_email):
         self.user_id = user_id # `_id` genearted by MongoDB automatcially
         self.user_email = user_email
-        self.game_list = game_list
 
 
     def get_id(self):
         return str(self.user_id)
 
 
+    @staticmethod
+    def invalidate(user_id) -> None:
+        """Drops a user from `USER_CACHE` after the user has changed."""
+        USER_CACHE.pop(str(user_id))
+
+
     @staticmethod
     def find_user(user_id: str = '', user_email: str = '') -> 'User':
         """Retrieves a user with either of the given `user_id` or `user_email`
+
+        Only the identity fields are read, and a user found by `user_id` is served from `USER_CACHE` for a while.
         
         Args:
             user_id: The user_id to search for a specific user.
@@ -28,45 +48,50 @@ class User(UserMixin):
         if not user_id and not user_email:
             raise RuntimeError('Provide either of user_id or user_email.')
 
+        if user_id:
+            cached = USER_CACHE.get(str(user_id))
+            if cached is not None:
+                return User(ObjectId(user_id), cached['user_email'])
+
         user_db = connect_mongodb('users')
         user_collection = user_db.users
 
-        query = {"$or": []}
-        filter = [{'user_email': user_email}]
-
-        if user_id:
-            obj_id = ObjectId(user_id)
-            filter.append({'_id': obj_id})
+        # `$or` only when both are given, so that a single key is looked up on its own index.
+        if user_id and user_email:
+            query = {'$or': [{'_id': ObjectId(user_id)}, {'user_email': user_email}]}
+        elif user_id:
+            query = {'_id': ObjectId(user_id)}
+        else:
+            query = {'user_email': user_email}
 
-        query["$or"] = filter
-        user_data = user_collection.find_one(query)
+        user_data = user_collection.find_one(query, IDENTITY_PROJECTION)
         if user_data:
-            return User(user_data['_id'], user_data['user_email'], user_data['game_list'])
+            USER_CACHE.put(str(user_data['_id']), {'user_email': user_data['user_email']})
+            return User(user_data['_id'], user_data['user_email'])
         return None
 
 
     @staticmethod
     def create_user(user_email: str, user_password: str) -> 'User':
-        """Creates a user with the given email after verifying if a user with the same email exists.
+        """Creates a user with the given email, failing if a user with the same email exists.
         
         Args:
             user_email: the email address to create a User with.
         Returns:
             An instance of the user.
         """
-        user = User.find_user(user_email=user_email)
-        if not user:
-            user_db = connect_mongodb('users')
-            user_collection = user_db.users
-            hashed_password = User.hash_password(user_password)
-            user_collection.insert_one({
+        user_db = connect_mongodb('users')
+        user_collection = user_db.users
+        hashed_password = User.hash_password(user_password)
+        try:
+            # The unique index on `user_email` rejects a duplicate even when two sign-ups race.
+            result = user_collection.insert_one({
                 'user_email': user_email,
-                'password': hashed_password,
-                'game_list': []
+                'password': hashed_password
             })
-            return User.find_user(user_email=user_email)
-        else:
-            raise RuntimeError(f'A user already exists with the email: {user_email}')
+        except DuplicateKeyError as e:
+            raise RuntimeError(f'A user already exists with the email: {user_email}') from e
+        return User(result.inserted_id, user_email)
         
     
     @staticmethod
@@ -81,60 +106,100 @@ class User(UserMixin):
 
         obj_id = ObjectId(user_id)
         user_collection.delete_one({'_id':obj_id})
+        user_db.user_games.delete_many({'user_id': obj_id})
+        User.invalidate(user_id)
 
     
     @staticmethod
     def hash_password(password) -> bytes:
         """Hashes the password for security and returns it.
+
+        The hashing runs on `PASSWORD_HASHER`, with the cost factor of `BCRYPT_ROUNDS`.
         
         Args:
             password: a password to hash.
         Returns:
             the hashed password.
         """
-        bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
+        return PASSWORD_HASHER.hash(password)
 
-        return bcrypt.hashpw(bytes, salt)
+
+    @staticmethod
+    def check_password(user_id, password: str, hashed_password: bytes) -> bool:
+        """Checks the password of a user, rehashing it if `BCRYPT_ROUNDS` has changed since it was hashed.
+
+        Args:
+            user_id: the user ID of the user logging in.
+            password: the password the user entered.
+            hashed_password: the stored hash of the user's password.
+        Returns:
+            True if the password is correct.
+        """
+        if not PASSWORD_HASHER.verify(password, hashed_password):
+            return False
+        if PASSWORD_HASHER.needs_rehash(hashed_password):
+            try:
+                new_hashed_password = User.hash_password(password)
+            except RuntimeError:
+                # The hashing queue is full; the password is rehashed at a later login instead of failing this one.
+                return True
+            user_collection = connect_mongodb('users').users
+            user_collection.update_one({'_id': user_id}, {'$set': {'password': new_hashed_password}})
+        return True
 
 
     def add_game(self, target_game_data):
         """Adds the target game into the user's game list.
+
+        Only the ids of the release and the user's own answers are stored; the metadata of the game is read
+        from game_db whenever the list is shown, so it never goes stale.
         
         Args:
             target_game_data: the game data to add into the user's game list.
         """
-        # Call methods from Game class when needed
-        # For now, it's only for `released` but it will expand to update other attributes such as Metacrtic score
-        if not target_game_data['released']:
-            target_game = Game(**target_game_data)
-            target_game_data['released'] = target_game.released
-
-        self.game_list.append(target_game_data)
         user_db = connect_mongodb('users')
-        user_collection = user_db.users
-
-        user_collection.update_one(
-            {'_id': self.user_id},
-            {'$addToSet': {'game_list': target_game_data}}
+        user_game_collection = user_db.user_games
+
+        # Keyed by the unique index on (user_id, game_id, release_id), adding a game costs the same however long the list is.
+        # Adding the same release again updates the user's answers instead of making a second entry.
+        key = {'user_id': self.user_id, 'game_id': int(target_game_data['game_id']), 'release_id': int(target_game_data['release_id'])}
+        answers = {field: target_game_data[field] for field in USER_GAME_FIELDS if field in target_game_data}
+        user_game_collection.update_one(
+            key,
+            {'$set': {**answers, **key}, '$setOnInsert': {'added_at': datetime.now(timezone.utc)}},
+            upsert=True
         )
 
 
-    def fetch_game_list(self):
-        """Fetches the game list of the current user by validating each game up to date."""
-        for game in self.game_list:
-            self.validate_game(game)
+    def fetch_game_list(self, limit: int = GAME_LIST_PAGE_SIZE, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Fetches a page of the game list of the current user, i.e. the ids of each release and the user's answers.
 
-        return self.game_list
-    
+        The games come in the order they were added, and the page is found by keyset on `_id`,
+        so a page costs the same wherever it is in the list. See `GameManager.get_releases` for their metadata.
 
-    def validate_game(self, game: Game) -> None:
-        """Validates a game's status.
-        
         Args:
-            game: The game to validate
+            limit: the maximum number of games in the page.
+            cursor: the `next_cursor` of the previous page, None for the first page.
+
+        Returns:
+            {'games': the games of the page, 'next_cursor': the cursor of the next page or None}
+
+        Raises:
+            ValueError: if the cursor is malformed.
         """
-        # TODO call game.update_status()
-        # Only if game.released is false or None
-        if not game['released']:
-            game._is_released()
+        query = {'user_id': self.user_id}
+        if cursor:
+            try:
+                query['_id'] = {'$gt': ObjectId(cursor)}
+            except InvalidId as e:
+                raise ValueError(f'Invalid game list cursor: {cursor}') from e
+
+        user_game_collection = connect_mongodb('users').user_games
+        projection = {'game_id': 1, 'release_id': 1, **{field: 1 for field in USER_GAME_FIELDS}}
+        games = list(user_game_collection.find(query, projection).sort('_id', 1).limit(limit + 1))
+        next_cursor = str(games[limit - 1]['_id']) if len(games) > limit else None
+        games = games[:limit]
+        for game in games:
+            del game['_id']
+
+        return {'games': games, 'next_cursor': next_cursor}
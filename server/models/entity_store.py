@@ -0,0 +1,80 @@
+"""Keeps the raw JSON of Wikidata entities on disk so that they are not downloaded again."""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Tuple
+
+entity_store_path = os.path.join(os.getcwd(), 'server', 'cache', 'wikidata_entities.sqlite')
+
+# The number of seconds a stored entity is used as is before being revalidated against its `lastrevid`
+ENTITY_STORE_MAX_AGE = float(os.getenv('ENTITY_STORE_MAX_AGE', 7 * 24 * 3600))
+
+SQLITE_MAX_VARIABLES = 900 # stays under the default limit of bound parameters per statement
+
+
+class EntityStore:
+    """A SQLite store of raw Wikidata entities keyed by entity code and language.
+
+    Each entity is kept zlib-compressed along with its `lastrevid`, which tells whether it changed on Wikidata.
+    """
+    def __init__(self, path: str = entity_store_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self.connection.execute('PRAGMA journal_mode=WAL;')
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS entities (
+                    code TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    lastrevid INTEGER,
+                    fetched_at REAL NOT NULL,
+                    payload BLOB NOT NULL,
+                    PRIMARY KEY (code, language)
+                ) WITHOUT ROWID;""")
+
+
+    def get_many(self, codes: List[str], language: str) -> Dict[str, Tuple[int, float, Dict]]:
+        """Returns the stored entities of the given codes as {code: (lastrevid, fetched_at, entity)}."""
+        stored = {}
+        for start in range(0, len(codes), SQLITE_MAX_VARIABLES):
+            chunk = codes[start:start + SQLITE_MAX_VARIABLES]
+            with self._lock:
+                rows = self.connection.execute(
+                    f'SELECT code, lastrevid, fetched_at, payload FROM entities WHERE language = ? AND code IN ({", ".join(["?"] * len(chunk))});',
+                    (language, *chunk)).fetchall()
+            for code, lastrevid, fetched_at, payload in rows:
+                stored[code] = (lastrevid, fetched_at, json.loads(zlib.decompress(payload)))
+        return stored
+
+
+    def put_many(self, entities: Dict[str, Dict], language: str) -> None:
+        """Stores raw entities as returned by `wbgetentities`, replacing the older versions."""
+        now = time.time()
+        rows = [(code, language, entity.get('lastrevid'), now, zlib.compress(json.dumps(entity, separators=(',', ':')).encode('utf-8')))
+                for code, entity in entities.items()]
+        with self._lock:
+            self.connection.executemany('INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?);', rows)
+
+
+    def touch(self, codes: List[str], language: str) -> None:
+        """Marks the entities as revalidated now, i.e. unchanged on Wikidata."""
+        now = time.time()
+        with self._lock:
+            self.connection.executemany('UPDATE entities SET fetched_at = ? WHERE code = ? AND language = ?;',
+                                        [(now, code, language) for code in codes])
+
+
+    def iter_codes(self, language: str) -> Iterator[str]:
+        """Yields the codes of every stored entity in the language."""
+        with self._lock:
+            codes = [row[0] for row in self.connection.execute('SELECT code FROM entities WHERE language = ?;', (language,))]
+        yield from codes
+
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
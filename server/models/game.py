@@ -57,7 +57,7 @@ class Game:
         self.publishers = publishers.split(', ')
         self.release_id = release_id
         self.release_date = datetime.strptime(release_date, '%Y-%m-%d')
-        self.released = True if released else self._is_released
+        self.released = True if released else False # kept up to date in game_db by `GameManager.run_release_sweeper`
         self.platforms = platforms.split(', ')
 
         # Attributes to be updated per user, stored in their DB, not stored in game_db
@@ -129,20 +129,6 @@ class Game:
             self.update_status()
 
 
-    def _is_released(self) -> bool:
-        """Verifies whether a game has been released."""
-        current_date = datetime.today()
-        released = None
-        if not self.release_date:
-            released = False
-        elif self.release_date:
-            if self.release_date <= current_date:
-                released = True
-            else:
-                released = False
-        return released
-
-
     def _calculate_days_till_release(self) -> int:
         """Verifies if the game will be released soon."""
         if not self.release_date:
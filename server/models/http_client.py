@@ -0,0 +1,125 @@
+"""Holds the long-lived HTTP client shared by every request sent to Wikidata."""
+import asyncio
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from email.utils import parsedate_to_datetime
+import httpx
+import os
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+load_dotenv()
+
+WIKIDATA_API_URL = os.getenv('WIKIDATA_API_URL', 'https://www.wikidata.org/w/api.php') # a local stand-in can be set when benchmarking
+USER_AGENT = 'game_tracker (hyobin90@gmail.com)' # TODO store the project info somewhere else
+
+# Limits of the connection pool, configurable through the environment
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 20))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', 10))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30.0))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 30.0))
+
+# Politeness towards Wikidata, configurable through the environment
+HTTP_REQUESTS_PER_SECOND = float(os.getenv('HTTP_REQUESTS_PER_SECOND', 5.0)) # per host
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 5))
+HTTP_DEFAULT_RETRY_AFTER = 5.0 # seconds to wait when 429 or 503 comes without `Retry-After`
+RETRYABLE_STATUS_CODES = (429, 503)
+
+HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+class HostRateLimiter:
+    """Spaces out requests per host and pauses a host when it asks to slow down."""
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.next_slots: Dict[str, float] = {}
+
+
+    async def acquire(self, host: str) -> None:
+        """Waits until the next request to the host is allowed."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self.next_slots.get(host, now))
+        # Reserves the slot before sleeping so that concurrent callers queue up behind each other.
+        self.next_slots[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+    def pause(self, host: str, seconds: float) -> None:
+        """Holds back every request to the host for the given number of seconds."""
+        resume_at = asyncio.get_running_loop().time() + seconds
+        self.next_slots[host] = max(self.next_slots.get(host, resume_at), resume_at)
+
+
+RATE_LIMITER = HostRateLimiter(HTTP_REQUESTS_PER_SECOND)
+
+
+def _parse_retry_after(value: Optional[str]) -> float:
+    """Converts `Retry-After` in either seconds or an HTTP date into seconds to wait."""
+    if not value:
+        return HTTP_DEFAULT_RETRY_AFTER
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return HTTP_DEFAULT_RETRY_AFTER
+
+
+def _is_http2_available() -> bool:
+    """Checks if the optional `h2` package needed by HTTP/2 is installed."""
+    try:
+        import h2 # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared `AsyncClient`, creating it on the first call.
+
+    The client keeps connections alive between calls so that consecutive requests to Wikidata
+    reuse the same TCP/TLS connection instead of paying a handshake each time.
+    Note that the client has to be used from the same event loop it was first used on.
+    """
+    global HTTP_CLIENT
+    if HTTP_CLIENT is None or HTTP_CLIENT.is_closed:
+        limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                              max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                              keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+        HTTP_CLIENT = httpx.AsyncClient(http2=_is_http2_available(), limits=limits,
+                                        timeout=HTTP_TIMEOUT, headers={'User-Agent': USER_AGENT})
+    return HTTP_CLIENT
+
+
+async def close_http_client() -> None:
+    """Closes the shared `AsyncClient` and its pooled connections."""
+    global HTTP_CLIENT
+    if HTTP_CLIENT is not None:
+        await HTTP_CLIENT.aclose()
+        HTTP_CLIENT = None
+
+
+async def get_json(url: str, params: Dict[str, Any]) -> Any:
+    """Sends a GET request with the shared client and returns the response in JSON format.
+
+    Requests are rate limited per host and retried when the host answers 429 or 503,
+    after waiting as long as its `Retry-After` header asks.
+
+    Raises:
+        httpx.HTTPStatusError: if the response is still an error after `HTTP_MAX_RETRIES` retries.
+    """
+    host = urlsplit(url).netloc
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        await RATE_LIMITER.acquire(host)
+        response = await get_http_client().get(url, params=params)
+        if response.status_code in RETRYABLE_STATUS_CODES and attempt < HTTP_MAX_RETRIES:
+            retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+            print(f'{host} responded {response.status_code}, retrying in {retry_after:.1f} seconds.')
+            RATE_LIMITER.pause(host, retry_after)
+            continue
+        response.raise_for_status()
+        return response.json()
@@ -1,27 +1,82 @@
+"""Holds the process-wide MongoDB client shared by every request."""
+from dotenv import load_dotenv
+import os
 import pymongo
-from typing import Literal
+import threading
+from typing import Literal, Optional
+from pymongo.database import Database
 
-MONGO_HOST = 'localhost'
-MONGO_CONNECTION = pymongo.MongoClient(f'mongodb://{MONGO_HOST}')
+load_dotenv()
 
-# TODO improve the code in case MongoDB completely shuts down
-def connect_mongodb(db_name: Literal['users', 'sessions']):
+MONGO_HOST = os.getenv('MONGO_HOST', 'localhost')
+
+# Limits of the connection pool, configurable through the environment
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 10000))
+
+MONGO_CLIENT: Optional[pymongo.MongoClient] = None
+_client_lock = threading.Lock()
+
+
+def get_mongo_client() -> pymongo.MongoClient:
+    """Returns the shared `MongoClient`, creating it on the first call.
+
+    The client is thread-safe and pools its connections, and its background monitor keeps track of the server,
+    so a request borrows a connection without checking the server first.
+    If the server goes down, operations fail after `MONGO_SERVER_SELECTION_TIMEOUT_MS` and the client reconnects by itself.
+    """
+    global MONGO_CLIENT
+    if MONGO_CLIENT is None:
+        with _client_lock:
+            if MONGO_CLIENT is None:
+                MONGO_CLIENT = pymongo.MongoClient(f'mongodb://{MONGO_HOST}',
+                                                   maxPoolSize=MONGO_MAX_POOL_SIZE,
+                                                   minPoolSize=MONGO_MIN_POOL_SIZE,
+                                                   maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                                                   serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                                                   connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                                                   socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS)
+    return MONGO_CLIENT
+
+
+def close_mongo_client() -> None:
+    """Closes the shared `MongoClient` and its pooled connections."""
+    global MONGO_CLIENT
+    with _client_lock:
+        if MONGO_CLIENT is not None:
+            MONGO_CLIENT.close()
+            MONGO_CLIENT = None
+
+
+def connect_mongodb(db_name: Literal['users', 'sessions']) -> Database:
     """Connects to MongoDB.
-    
+
+    No round-trip is made here; the first operation on the database borrows a pooled connection.
+
     Args:
         db_name: The name of the database to retrieve.
-    
+
     Returns:
         An instance of the selected database.
     """
-    global MONGO_CONNECTION
-    try:
-        MONGO_CONNECTION.admin.command('hello') # send `hello` command to `admin` db to check the availability of the server
-    except:
-        MONGO_CONNECTION = pymongo.MongoClient(f'mongodb://{MONGO_HOST}')
-
-    if db_name == 'users':
-        return MONGO_CONNECTION.users
-    elif db_name == 'sessions':
-        return MONGO_CONNECTION.sessions
-    
+    if db_name not in ('users', 'sessions'):
+        raise ValueError(f'Unknown database: {db_name}')
+    return get_mongo_client()[db_name]
+
+
+def ensure_mongo_indexes() -> None:
+    """Creates the indexes the queries rely on, doing nothing for the ones that already exist.
+
+    The unique index on `user_email` lets sign-ups be rejected atomically by the server
+    instead of by a lookup followed by an insert, and the one on (user_id, game_id, release_id) does the same
+    for the games added into a user's game list. The games of a user are paged through in order of `_id`.
+    """
+    user_db = connect_mongodb('users')
+    user_db.users.create_index([('user_email', pymongo.ASCENDING)], unique=True, name='user_email_unique')
+    user_db.user_games.create_index([('user_id', pymongo.ASCENDING), ('game_id', pymongo.ASCENDING), ('release_id', pymongo.ASCENDING)],
+                                    unique=True, name='user_game_unique')
+    user_db.user_games.create_index([('user_id', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)], name='user_game_order')
@@ -1,8 +1,11 @@
 from aiomysql import connect, create_pool, DictCursor, OperationalError, ProgrammingError, IntegrityError
+from server.models.http_client import get_http_client, USER_AGENT
 from utils.async_sparql_wrapper import AsyncSparqlWrapper
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import os
-from typing import Any, Dict, Tuple, Optional
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple, Optional
 from SPARQLWrapper import JSON
 
 # load the credential for the DB
@@ -14,6 +17,15 @@ local_db_user = os.getenv('LOCAL_SQL_DB_USER')
 local_db_passwd = os.getenv('LOCAL_SQL_PASSWD')
 game_db_schema_path = os.path.join(os.getcwd(), 'server', 'schemas', 'game_db_schema.sql')
 
+# Settings of the Connection pool
+MYSQL_POOL_MINSIZE = int(os.getenv('MYSQL_POOL_MINSIZE', 1))
+MYSQL_POOL_MAXSIZE = int(os.getenv('MYSQL_POOL_MAXSIZE', 10))
+MYSQL_POOL_RECYCLE = int(os.getenv('MYSQL_POOL_RECYCLE', 3600)) # seconds before an idle Connection is reopened
+MYSQL_SLOW_QUERY_SECONDS = os.getenv('MYSQL_SLOW_QUERY_SECONDS') # prints the queries slower than this if set
+
+# Hooks called with (query_type, query, elapsed seconds) after every statement sent by `query_db_with_pool`
+QUERY_HOOKS: List[Callable[[str, str, float], None]] = []
+
 # for Wikidata
 WIKIDATA_SPARQL_URL = "https://query.wikidata.org/sparql"
 
@@ -38,28 +50,61 @@ async def create_mysql_db(host: str, port: int, user: str, passwd: str, db_name:
         async with db_connection.cursor() as db_cursor:
             await db_cursor.execute(f'CREATE DATABASE {db_name}')
             await db_cursor.execute(f'USE {db_name}')
-            await create_mysql_db(local_db_host, local_db_port, local_db_user, local_db_passwd, 'game_db', game_db_schema_path)
+            await create_mysql_db(host, port, user, passwd, db_name, schema_path)
     except ProgrammingError as e:
         print(f'Error occurred while creating DB: {e}')
     except Exception as e:
         raise Exception(f'Error occurred in `create_mysql_db()`: {e}') from e
 
 
-async def init_pool(host: str, port: int, user: str, passwd: str):
-    """Initializes the pool of Connection."""
-    pool = await create_pool(host=host, port=port, user=user, password=passwd)
+async def init_pool(host: str, port: int, user: str, passwd: str, db_name: Optional[str] = None,
+                    minsize: int = MYSQL_POOL_MINSIZE, maxsize: int = MYSQL_POOL_MAXSIZE, pool_recycle: int = MYSQL_POOL_RECYCLE):
+    """Initializes the pool of Connection.
+
+    Every Connection is bound to `db_name` when it's given, so queries need no `USE` beforehand.
+    Autocommit is on so that a plain SELECT never leaves a stale snapshot open on a pooled Connection;
+    `transaction_with_pool` starts an explicit transaction when several statements must commit together.
+
+    Args:
+        db_name: the default database of every Connection.
+        minsize: the number of Connections opened up front.
+        maxsize: the maximum number of Connections.
+        pool_recycle: the number of seconds after which a Connection is reopened, -1 to keep it forever.
+    """
+    if db_name:
+        pool = await create_pool(host=host, port=port, user=user, password=passwd, db=db_name, autocommit=True,
+                                 minsize=minsize, maxsize=maxsize, pool_recycle=pool_recycle)
+    else:
+        pool = await create_pool(host=host, port=port, user=user, password=passwd, autocommit=True,
+                                 minsize=minsize, maxsize=maxsize, pool_recycle=pool_recycle)
     return pool
 
 
+def add_query_hook(hook: Callable[[str, str, float], None]) -> None:
+    """Registers a hook to be called with (query_type, query, elapsed seconds) after every statement."""
+    QUERY_HOOKS.append(hook)
+
+
+def _print_slow_query(query_type: str, query: str, elapsed: float) -> None:
+    """Prints a statement that took longer than `MYSQL_SLOW_QUERY_SECONDS`."""
+    if elapsed >= float(MYSQL_SLOW_QUERY_SECONDS):
+        print(f'Slow {query_type} query took {elapsed * 1000:.1f} ms | {" ".join(query.split())[:200]}')
+
+
+if MYSQL_SLOW_QUERY_SECONDS:
+    add_query_hook(_print_slow_query)
+
+
 async def init_db(host: str, port: int, user: str, passwd: str, db_name: str, schema_path: str):
     """Calls `create_mysql_db` and `init_pool` in succession."""
     await create_mysql_db(host, port, user, passwd, db_name, schema_path)
-    pool = await init_pool(host, port, user, passwd)
+    pool = await init_pool(host, port, user, passwd, db_name)
     return pool
 
 
 async def query_db_with_pool(pool, query_type: str, query: str, values: Optional[Tuple] = None) -> Optional[Any]:
     """Sends a query to DB using Connection pool."""
+    started = time.perf_counter()
     try:
         async with pool.acquire() as db_connection:
             async with db_connection.cursor(DictCursor) as db_cursor:
@@ -76,6 +121,34 @@ async def query_db_with_pool(pool, query_type: str, query: str, values: Optional
         raise IntegrityError() from e
     except Exception as e:
         raise RuntimeError(f'Error occurred while querying | {type(e)} : {e}') from e
+    finally:
+        elapsed = time.perf_counter() - started
+        for hook in QUERY_HOOKS:
+            hook(query_type, query, elapsed)
+
+
+@asynccontextmanager
+async def transaction_with_pool(pool) -> AsyncIterator[DictCursor]:
+    """Acquires one Connection from the pool and yields its cursor so that every statement runs in one transaction.
+
+    The transaction is committed when the block exits normally and rolled back when it raises.
+    The hooks in `QUERY_HOOKS` are called once for the whole transaction with the query type `TRANSACTION`.
+    """
+    started = time.perf_counter()
+    try:
+        async with pool.acquire() as db_connection:
+            await db_connection.begin()
+            try:
+                async with db_connection.cursor(DictCursor) as db_cursor:
+                    yield db_cursor
+            except BaseException:
+                await db_connection.rollback()
+                raise
+            await db_connection.commit()
+    finally:
+        elapsed = time.perf_counter() - started
+        for hook in QUERY_HOOKS:
+            hook('TRANSACTION', 'transaction_with_pool', elapsed)
 
 
 async def query_wikidata(query_template: str, values: Dict) -> Any:
@@ -97,8 +170,8 @@ async def query_wikidata(query_template: str, values: Dict) -> Any:
     """
     query = query_template.format(**values)
 
-    sparql_wikidata = AsyncSparqlWrapper(WIKIDATA_SPARQL_URL)
-    sparql_wikidata.addCustomHttpHeader("User-Agent", "game_tracker (hyobin90@gmail.com)") # TODO store the project info somewhere else
+    sparql_wikidata = AsyncSparqlWrapper(WIKIDATA_SPARQL_URL, client=get_http_client())
+    sparql_wikidata.addCustomHttpHeader("User-Agent", USER_AGENT)
     sparql_wikidata.setQuery(query)
     sparql_wikidata.setReturnFormat(JSON)
     result = await sparql_wikidata.asyncQuery()
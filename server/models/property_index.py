@@ -0,0 +1,166 @@
+"""Holds the labels of Wikidata codes in a compact index instead of parsing `wikidata_properties.json` per instance."""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from server.models.entity_store import SQLITE_MAX_VARIABLES
+
+property_json_path = os.path.join(os.getcwd(), 'server', 'schemas', 'wikidata_properties.json')
+property_index_path = os.path.join(os.getcwd(), 'server', 'cache', 'wikidata_properties.sqlite')
+learned_labels_path = os.path.join(os.getcwd(), 'server', 'cache', 'learned_labels.sqlite')
+
+LEARNED_LABELS_MAX = int(os.getenv('LEARNED_LABELS_MAX', 50000)) # the number of learned labels kept on disk
+
+
+def load_json_for_properties(json_path: str) -> Dict[str, Dict[str, str]]:
+    """Loads the property data from `wikidata_properties.json` file into {property_name: {code: label}}."""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    properties = {}
+
+    for property_name in data:
+        temp = {}
+        for element in data[property_name]:
+            temp[element['code']] = element['label']
+        properties[property_name] = temp
+
+    return properties
+
+
+class PropertyIndex:
+    """A read-only SQLite index of the labels of Wikidata codes, built once from the json file.
+
+    The index file is rebuilt only when the json file is newer, and it's opened on the first lookup.
+    Every process reads the same file through the page cache of the OS rather than holding its own dictionaries.
+    """
+    def __init__(self, json_path: str = property_json_path, index_path: str = property_index_path):
+        self.json_path = json_path
+        self.index_path = index_path
+        self.connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+
+    def _is_outdated(self) -> bool:
+        """Checks if the index file is missing or older than the json file."""
+        return not os.path.exists(self.index_path) or os.path.getmtime(self.index_path) < os.path.getmtime(self.json_path)
+
+
+    def build(self) -> None:
+        """Builds the index file from the json file.
+
+        It's written to a temporary file first and moved into place so that other processes never see a partial index.
+        """
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        temp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        properties = load_json_for_properties(self.json_path)
+
+        connection = sqlite3.connect(temp_path)
+        try:
+            connection.execute("""
+                CREATE TABLE labels (
+                    property_name TEXT NOT NULL,
+                    code TEXT NOT NULL,
+                    label TEXT NOT NULL,
+                    PRIMARY KEY (property_name, code)
+                ) WITHOUT ROWID;""")
+            connection.executemany('INSERT OR REPLACE INTO labels VALUES (?, ?, ?);',
+                                   [(property_name, code, label) for property_name, labels in properties.items() for code, label in labels.items()])
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(temp_path, self.index_path)
+
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the index file, building it first if needed."""
+        if self.connection is None:
+            if self._is_outdated():
+                self.build()
+            self.connection = sqlite3.connect(f'file:{self.index_path}?mode=ro', uri=True, check_same_thread=False)
+        return self.connection
+
+
+    def lookup(self, property_name: str, codes: List[str]) -> List[Optional[str]]:
+        """Finds the labels of the codes of a property, None for the codes not in the index."""
+        if not codes:
+            return []
+        labels = {}
+        for start in range(0, len(codes), SQLITE_MAX_VARIABLES - 1): # one variable is taken by the property name
+            chunk = codes[start:start + SQLITE_MAX_VARIABLES - 1]
+            with self._lock:
+                rows = self._connect().execute(
+                    f'SELECT code, label FROM labels WHERE property_name = ? AND code IN ({", ".join(["?"] * len(chunk))});',
+                    (property_name, *chunk)).fetchall()
+            labels.update(rows)
+        return [labels.get(code) for code in codes]
+
+
+    def close(self) -> None:
+        with self._lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+class LearnedLabelStore:
+    """A persistent SQLite cache of the labels learned from Wikidata for the codes missing from `PropertyIndex`.
+
+    The least recently used labels are evicted once the store holds more than `maxsize` labels.
+    """
+    def __init__(self, path: str = learned_labels_path, maxsize: int = LEARNED_LABELS_MAX):
+        self.path = path
+        self.maxsize = maxsize
+        self.connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the store file, creating it if needed."""
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.connection.execute('PRAGMA journal_mode=WAL;')
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS learned_labels (
+                    code TEXT NOT NULL PRIMARY KEY,
+                    label TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                );""")
+            self.connection.execute('CREATE INDEX IF NOT EXISTS last_used_idx ON learned_labels (last_used);')
+        return self.connection
+
+
+    def lookup(self, codes: List[str]) -> Dict[str, str]:
+        """Finds the learned labels of the codes and marks them as used."""
+        if not codes:
+            return {}
+        labels = {}
+        for start in range(0, len(codes), SQLITE_MAX_VARIABLES - 1): # one variable of the UPDATE is taken by the time
+            chunk = codes[start:start + SQLITE_MAX_VARIABLES - 1]
+            with self._lock:
+                connection = self._connect()
+                rows = connection.execute(f'SELECT code, label FROM learned_labels WHERE code IN ({", ".join(["?"] * len(chunk))});', chunk).fetchall()
+                if rows:
+                    connection.execute(f'UPDATE learned_labels SET last_used = ? WHERE code IN ({", ".join(["?"] * len(rows))});',
+                                       (time.time(), *(code for code, _ in rows)))
+            labels.update(rows)
+        return labels
+
+
+    def learn(self, labels: Dict[str, str]) -> None:
+        """Stores newly learned labels and evicts the least recently used ones beyond `maxsize`."""
+        if not labels:
+            return
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.executemany('INSERT OR REPLACE INTO learned_labels VALUES (?, ?, ?);',
+                                   [(code, label, now) for code, label in labels.items()])
+            connection.execute("""
+                DELETE FROM learned_labels WHERE code IN (
+                    SELECT code FROM learned_labels ORDER BY last_used
+                    LIMIT MAX((SELECT COUNT(*) FROM learned_labels) - ?, 0)
+                );""", (self.maxsize,))
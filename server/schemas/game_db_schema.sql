@@ -24,5 +24,6 @@ CREATE TABLE IF NOT EXISTS date_platform_table (
     released BOOLEAN,
     platforms VARCHAR(255),
     regions VARCHAR(255),
-    FOREIGN KEY (game_id) REFERENCES game_table(game_id)
+    FOREIGN KEY (game_id) REFERENCES game_table(game_id),
+    INDEX release_date_released_idx (release_date, released)
 );
\ No newline at end of file
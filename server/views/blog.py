@@ -1,9 +1,12 @@
-import bcrypt
 import datetime
-from flask import Blueprint, request, render_template, redirect, url_for, jsonify
+from flask import Blueprint, request, render_template, redirect, url_for, jsonify, session
 from flask_login import current_user, login_user, logout_user, login_required
-from instances import game_manager
-from server.controllers.user_manager import User
+from instances import game_manager, run_async
+from server.controllers.game_manager import SEARCH_PAGE_SIZE
+from server.controllers.password_hasher import PASSWORD_HASHER
+from server.controllers.session_store import LazySession
+from server.controllers.suggest_index import SUGGEST_TOP_K
+from server.controllers.user_manager import User, GAME_LIST_PAGE_SIZE
 from server.models.mongodb import connect_mongodb
 
 blog = Blueprint('blog', __name__) # TODO check if the relative path works well
@@ -27,6 +30,8 @@ def sign_up():
 
         try:
             new_user = User.create_user(user_email, password)    # Create a user
+            if isinstance(session, LazySession):
+                session.regenerate() # a new session id at login, against session fixation
             login_user(new_user, remember=True, duration=datetime.timedelta(days=30))   # Create a session (the new user is logged in right away)
             return redirect(url_for('.load_main_page'))
         except RuntimeError as e:
@@ -42,15 +47,21 @@ def log_in():
 
         user_db = connect_mongodb('users')
         user_collection = user_db.users
-        user_data = user_collection.find_one({'user_email':user_email})
+        user_data = user_collection.find_one({'user_email':user_email}, {'user_email': 1, 'password': 1})
         if user_data:
             hashed_password = user_data['password']
-            if bcrypt.checkpw(entered_password.encode('utf-8'), hashed_password):
+            try:
+                is_correct = User.check_password(user_data['_id'], entered_password, hashed_password)
+            except RuntimeError as e:
+                print(f'A login has been refused as the password hashing queue is full | {PASSWORD_HASHER.format_stats()}')
+                return render_template('index.html', error=str(e)), 503
+            if is_correct:
                 user = User(
                     user_id=user_data['_id'],
-                    user_email=user_data['user_email'],
-                    game_list=user_data.get('game_list', [])
+                    user_email=user_data['user_email']
                 )
+                if isinstance(session, LazySession):
+                    session.regenerate() # a new session id at login, against session fixation
                 login_user(user, remember=True, duration=datetime.timedelta(days=30))
                 return redirect(url_for('.load_main_page'))
             else:
@@ -77,13 +88,29 @@ def delete_account():
 
 @blog.route('/search', methods=['GET'])
 def search_for_games():
-    """Searchs for the target game with the given keywords."""
+    """Searchs for the target game with the given keywords, one page at a time.
+
+    Passing the `next_cursor` of a page as `cursor` returns the following page.
+    """
     search_keyword = request.args.get('search_keyword')
+    limit = min(max(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 1), 100)
+    cursor = request.args.get('cursor') or None
+
+    try:
+        page = run_async(game_manager.find_candiates(search_keyword, limit, cursor))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(page)
+
 
-    candidates = None
-    candidates = game_manager.loop.run_until_complete(game_manager.find_candiates(search_keyword))
+@blog.route('/suggest', methods=['GET'])
+def suggest_titles():
+    """Suggests titles for autocompletion while the user types the search keywords."""
+    prefix = request.args.get('prefix', '')
+    limit = min(max(request.args.get('limit', SUGGEST_TOP_K, type=int), 1), SUGGEST_TOP_K) # each node keeps only its best SUGGEST_TOP_K
 
-    return jsonify(candidates)
+    return jsonify(game_manager.suggest_titles(prefix, limit))
 
 
 @blog.route('/add_game', methods=['GET', 'POST'])
@@ -100,5 +127,20 @@ def add_game_into_game_list():
 @blog.route('/get_user_game_list', methods=['GET'])
 @login_required
 def get_user_game_list():
-    """Retrieves and returns the user's game list."""
-    return jsonify(current_user.fetch_game_list())
\ No newline at end of file
+    """Retrieves and returns the user's game list with the current metadata of each game, one page at a time.
+
+    Passing the `next_cursor` of a page as `cursor` returns the following page.
+    """
+    limit = min(max(request.args.get('limit', GAME_LIST_PAGE_SIZE, type=int), 1), 200)
+    cursor = request.args.get('cursor') or None
+
+    try:
+        page = current_user.fetch_game_list(limit, cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # The whole page is read from game_db in one query, so the dates, the release status and the scores are current.
+    releases = run_async(game_manager.get_releases([(game['game_id'], game['release_id']) for game in page['games']]))
+    page['games'] = [{**releases.get((game['game_id'], game['release_id']), {}), **game} for game in page['games']]
+
+    return jsonify(page)
\ No newline at end of file
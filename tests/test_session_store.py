@@ -0,0 +1,79 @@
+"""Checks that sessions are read from the store only by the requests that use them."""
+import unittest
+from flask import Flask, session
+from flask_login import LoginManager, UserMixin, login_user
+from server.controllers.session_store import MemorySessionStore, StoreSessionInterface
+
+
+class CountingStore(MemorySessionStore):
+    """A memory store counting its reads."""
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+
+    def get(self, sid):
+        self.reads += 1
+        return super().get(sid)
+
+
+class TestUser(UserMixin):
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+def make_app(store):
+    """Makes an app configured like app.py, with Flask-Login and strong session protection."""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = StoreSessionInterface(store)
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.session_protection = 'strong'
+    login_manager.user_loader(TestUser)
+
+    @app.route('/untouched')
+    def untouched():
+        return 'ok'
+
+    @app.route('/visit')
+    def visit():
+        session['visited'] = True
+        return 'ok'
+
+    @app.route('/log_in')
+    def log_in():
+        session.regenerate()
+        login_user(TestUser('user'), remember=True)
+        return 'ok'
+
+    return app
+
+
+class TestLazySession(unittest.TestCase):
+    def setUp(self):
+        self.store = CountingStore()
+        self.client = make_app(self.store).test_client()
+
+
+    def test_untouched_session_is_not_read(self):
+        self.client.get('/log_in')
+        self.assertIsNotNone(self.client.get_cookie('session'))
+        self.store.reads = 0
+        self.client.get('/untouched')
+        self.assertEqual(self.store.reads, 0)
+
+
+    def test_log_in_issues_a_new_sid(self):
+        self.client.get('/visit')
+        old_sid = self.client.get_cookie('session').value
+        self.client.get('/log_in')
+        new_sid = self.client.get_cookie('session').value
+        self.assertNotEqual(old_sid, new_sid)
+        self.assertIsNone(self.store.get(old_sid))
+        self.assertEqual(self.store.get(new_sid)['visited'], True)
+        self.assertEqual(self.store.get(new_sid)['_user_id'], 'user')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,38 +1,215 @@
+import argparse
 import asyncio
-from server.models.mysqldb import create_mysql_db, init_pool, local_db_host, local_db_passwd, local_db_port, local_db_user, game_db_schema_path, query_db_with_pool
-from server.controllers.game_manager import GameManager
+import time
+from server.models.mysqldb import init_db, create_mysql_db, query_db_with_pool, local_db_host, local_db_passwd, local_db_port, local_db_user, game_db_schema_path
+from server.models.http_client import close_http_client
+from server.models.mongodb import connect_mongodb, ensure_mongo_indexes
+from server.controllers.game_manager import GameManager, INSERT_BATCH_SIZE
+from server.controllers.user_manager import USER_GAME_FIELDS
+from utils.json_tools import iter_game_titles
 import os
-import json
-from pprint import pprint
-import re
+from pymongo import UpdateOne
+from typing import Iterator, Set
 
+game_list_json_path = os.path.join(os.getcwd(), 'server', 'schemas', 'All_PlayStation_Games.json')
+checkpoint_path = os.path.join(os.getcwd(), 'fill_up_game_db.checkpoint')
+filter_conditions = ['Pysical extras', 'Special edition', 'Currency', 'Compilation', 'Digital extras', 'Customization / outfit / skin', 'Upgrade (Skill / Boost)', 'Player unit', 'Other']
 
-async def fill_up_game_db():
-    """Fills up the game db from Wikidata using a given json file"""
+
+class IngestStats:
+    """Counters of the progress of `fill_up_game_db`."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.titles = 0
+        self.entities = 0
+        self.failures = 0
+
+
+    def report(self) -> str:
+        """Makes a one-line summary of the progress and the throughput."""
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (f'titles: {self.titles} ({self.titles / elapsed:.2f}/sec) | '
+                f'entities: {self.entities} ({self.entities / elapsed:.2f}/sec) | '
+                f'failures: {self.failures} | elapsed: {elapsed:.0f}s')
+
+
+def load_game_titles(json_path: str) -> Iterator[str]:
+    """Streams the titles to add from a json or JSONL file, leaving out the entries that are not games."""
+    return iter_game_titles(json_path, filter_conditions)
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Loads the titles already completed by a previous run."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+async def fill_up_game_db(json_path: str = game_list_json_path, concurrency: int = 8,
+                          checkpoint: str = checkpoint_path, report_interval: float = 10.0):
+    """Fills up the game db from Wikidata using a given json file.
+
+    A producer puts the titles into a bounded queue and `concurrency` workers resolve them at the same time.
+    Every completed title is appended to the checkpoint file so that a crashed run resumes where it stopped.
+
+    Args:
+        json_path: the path to the json or JSONL file listing the titles, streamed so that the workers start on the first title.
+        concurrency: the number of titles resolved at the same time.
+        checkpoint: the path to the checkpoint file.
+        report_interval: the number of seconds between progress reports.
+    """
     # Initialize `game_db`
-    await create_mysql_db(host=local_db_host, port=local_db_port, user=local_db_user, passwd=local_db_passwd, db_name='game_db', schema_path=game_db_schema_path)
-    db_connection_pool = await init_pool(host=local_db_host, port=local_db_port, user=local_db_user, passwd=local_db_passwd, db_name='game_db')
-
-    game_list_json_path = os.path.join(os.getcwd(), 'DB', 'All_PlayStation_Games.json')
-    game_titles = []
-    filter_conditions = ['Pysical extras', 'Special edition', 'Currency', 'Compilation', 'Digital extras', 'Customization / outfit / skin', 'Upgrade (Skill / Boost)', 'Player unit', 'Other']
-
-    with open(game_list_json_path, 'r', encoding='utf-8') as f:
-        game_list_json = json.load(f)
-        for game_entry in game_list_json:
-            genres = game_entry.get('genres', [])
-            if any(genre in filter_conditions for genre in genres):
+    db_connection_pool = await init_db(host=local_db_host, port=local_db_port, user=local_db_user,
+                                       passwd=local_db_passwd, db_name='game_db', schema_path=game_db_schema_path)
+    game_manager = GameManager(asyncio.get_running_loop(), db_connection_pool)
+
+    completed_titles = load_checkpoint(checkpoint)
+    if completed_titles:
+        print(f'Resuming: {len(completed_titles)} titles have already been completed.')
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    stats = IngestStats()
+
+    async def produce():
+        for title in load_game_titles(json_path):
+            if title not in completed_titles:
+                await queue.put(title)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def consume(checkpoint_file):
+        while True:
+            title = await queue.get()
+            if title is None:
+                return
+            try:
+                entity_codes = await game_manager._search_wikidata(title)
+                stats.entities += await game_manager._add_new_games(entity_codes)
+                checkpoint_file.write(f'{title}\n')
+                checkpoint_file.flush()
+            except Exception as e:
+                stats.failures += 1
+                print(f'Failed to add {title} | {e}')
+            stats.titles += 1
+
+    async def report():
+        while True:
+            await asyncio.sleep(report_interval)
+            print(stats.report())
+
+    reporter = asyncio.create_task(report())
+    try:
+        with open(checkpoint, 'a', encoding='utf-8') as checkpoint_file:
+            await asyncio.gather(produce(), *(consume(checkpoint_file) for _ in range(concurrency)))
+    finally:
+        reporter.cancel()
+        print(stats.report())
+        print(f'labels: {game_manager.label_stats} | hit rates: {game_manager.label_hit_rates()}')
+        # The last to step before closing the app
+        await close_http_client()
+        db_connection_pool.close()
+        await db_connection_pool.wait_closed()
+
+
+async def rebuild_game_db(reset: bool = False, language: str = 'en'):
+    """Fills up game_db only from the Wikidata entities stored on disk, without any request to Wikidata.
+
+    Args:
+        reset: a flag to drop the tables and create them again from the schema file first, e.g. after changing the schema.
+        language: the language the entities were stored in.
+    """
+    db_connection_pool = await init_db(host=local_db_host, port=local_db_port, user=local_db_user,
+                                       passwd=local_db_passwd, db_name='game_db', schema_path=game_db_schema_path)
+    try:
+        if reset:
+            await query_db_with_pool(db_connection_pool, 'UPDATE', 'DROP TABLE IF EXISTS date_platform_table, game_table;')
+            await create_mysql_db(host=local_db_host, port=local_db_port, user=local_db_user, passwd=local_db_passwd,
+                                  db_name='game_db', schema_path=game_db_schema_path)
+
+        game_manager = GameManager(asyncio.get_running_loop(), db_connection_pool, offline=True)
+        stats = IngestStats()
+        codes = list(game_manager.entity_store.iter_codes(language))
+        for start in range(0, len(codes), INSERT_BATCH_SIZE):
+            stats.entities += await game_manager._add_new_games(codes[start:start + INSERT_BATCH_SIZE])
+            stats.titles += len(codes[start:start + INSERT_BATCH_SIZE])
+        print(stats.report())
+    finally:
+        db_connection_pool.close()
+        await db_connection_pool.wait_closed()
+
+
+async def sweep_release_status():
+    """Marks the releases whose date has come as released once, e.g. when the server is not running."""
+    db_connection_pool = await init_db(host=local_db_host, port=local_db_port, user=local_db_user,
+                                       passwd=local_db_passwd, db_name='game_db', schema_path=game_db_schema_path)
+    try:
+        game_manager = GameManager(asyncio.get_running_loop(), db_connection_pool, offline=True)
+        await game_manager.ensure_release_index()
+        release_ids = await game_manager.sweep_release_status()
+        print(f'{len(release_ids)} releases have been marked as released: {release_ids}')
+    finally:
+        db_connection_pool.close()
+        await db_connection_pool.wait_closed()
+
+
+def migrate_game_lists() -> None:
+    """Moves the games embedded in the `game_list` array of each user into the `user_games` collection.
+
+    Only the ids of each release and the user's answers are kept, as the metadata is read from game_db.
+
+    It can be run again safely: games already moved are left as they are. Entries without `game_id` or `release_id`
+    cannot be keyed in `user_games`, so they stay in `game_list` and are reported.
+    """
+    ensure_mongo_indexes()
+    user_db = connect_mongodb('users')
+    users = moved = skipped = 0
+    for user_data in user_db.users.find({'game_list': {'$exists': True}}, {'game_list': 1}):
+        operations = []
+        unkeyed_games = []
+        for game in user_data.get('game_list') or []:
+            if game.get('game_id') is None or game.get('release_id') is None:
+                unkeyed_games.append(game)
                 continue
-            game_title = game_entry['title']
-            game_titles.append(game_title)
+            key = {'user_id': user_data['_id'], 'game_id': int(game['game_id']), 'release_id': int(game['release_id'])}
+            answers = {field: game[field] for field in USER_GAME_FIELDS if field in game}
+            operations.append(UpdateOne(key, {'$setOnInsert': {**answers, **key}}, upsert=True))
+        if operations:
+            # Ordered so that the games keep the order they were added in.
+            moved += user_db.user_games.bulk_write(operations, ordered=True).upserted_count
+        if unkeyed_games:
+            user_db.users.update_one({'_id': user_data['_id']}, {'$set': {'game_list': unkeyed_games}})
+        else:
+            user_db.users.update_one({'_id': user_data['_id']}, {'$unset': {'game_list': ''}})
+        skipped += len(unkeyed_games)
+        users += 1
+    print(f'users: {users} | games moved: {moved} | games left in game_list: {skipped}')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Administrative tools for game_db.')
+    sub_parsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    fill_parser = sub_parsers.add_parser('fill_up_game_db', help='Add every title of a json file into game_db from Wikidata.')
+    fill_parser.add_argument('--json', type=str, default=game_list_json_path, help='The json or JSONL file listing the titles.')
+    fill_parser.add_argument('--concurrency', type=int, default=8, help='The number of titles resolved at the same time.')
+    fill_parser.add_argument('--checkpoint', type=str, default=checkpoint_path, help='The file recording completed titles.')
+    fill_parser.add_argument('--report_interval', type=float, default=10.0, help='The number of seconds between progress reports.')
+
+    rebuild_parser = sub_parsers.add_parser('rebuild_game_db', help='Fill up game_db offline from the stored Wikidata entities.')
+    rebuild_parser.add_argument('--reset', action='store_true', help='Drop and recreate the tables from the schema file first.')
 
-    game_manager = GameManager()
+    sub_parsers.add_parser('sweep_release_status', help='Mark the releases whose date has come as released.')
 
-    for title in game_titles:
-        await game_manager.resolve_game_entry(search_title=title, db_connection_pool=db_connection_pool, for_prep=True)
-    # The last to step before closing the app
-    db_connection_pool.close()
-    await db_connection_pool.wait_closed()
+    sub_parsers.add_parser('migrate_game_lists', help='Move the game lists embedded in the users into the user_games collection.')
 
-asyncio.run(fill_up_game_db())
+    args = arg_parser.parse_args()
 
+    if args.command == 'fill_up_game_db':
+        asyncio.run(fill_up_game_db(args.json, args.concurrency, args.checkpoint, args.report_interval))
+    elif args.command == 'rebuild_game_db':
+        asyncio.run(rebuild_game_db(args.reset))
+    elif args.command == 'sweep_release_status':
+        asyncio.run(sweep_release_status())
+    elif args.command == 'migrate_game_lists':
+        migrate_game_lists()
@@ -1,5 +1,5 @@
 from http.client import HTTPResponse
-from typing import Tuple, cast
+from typing import Optional, Tuple, cast
 
 
 from httpx import AsyncClient, HTTPStatusError, Response
@@ -15,36 +15,46 @@ from SPARQLWrapper.SPARQLExceptions import (
 
 # Hack the SparqlWrapper to add async methods
 class AsyncSparqlWrapper(SPARQLWrapper):
+    def __init__(self, endpoint: str, client: Optional[AsyncClient] = None, **kwargs):
+        super().__init__(endpoint, **kwargs)
+        # A shared client keeps its connections alive between queries; without it, a client is opened per query.
+        self.client = client
+
     async def _asyncQuery(self) -> Tuple[HTTPResponse, str]:
+        if self.client is not None:
+            return await self._sendRequest(self.client)
         async with AsyncClient() as client:
-            request = self._createRequest()
-
-            method = request.get_method()
-            url = request.get_full_url()
-            headers = dict(request.headers)
-            # May not have correct type?
-            data = request.data if method == "POST" else None
-
-            response = await client.request(
-                method, url, headers=headers, timeout=None, data=data
-            )
-            try:
-                response.raise_for_status()
-            except HTTPStatusError as e:
-                if e.response.status_code == 400:
-                    raise QueryBadFormed(e.response.read())
-                elif e.response.status_code == 404:
-                    raise EndPointNotFound(e.response.read())
-                elif e.response.status_code == 401:
-                    raise Unauthorized(e.response.read())
-                elif e.response.status_code == 414:
-                    raise URITooLong(e.response.read())
-                elif e.response.status_code == 500:
-                    raise EndPointInternalError(e.response.read())
-                else:
-                    raise e
-            # worst part of HACK
-            return cast(HTTPResponse, ResponseWrapper(response)), self.returnFormat
+            return await self._sendRequest(client)
+
+    async def _sendRequest(self, client: AsyncClient) -> Tuple[HTTPResponse, str]:
+        request = self._createRequest()
+
+        method = request.get_method()
+        url = request.get_full_url()
+        headers = dict(request.headers)
+        # May not have correct type?
+        data = request.data if method == "POST" else None
+
+        response = await client.request(
+            method, url, headers=headers, timeout=None, data=data
+        )
+        try:
+            response.raise_for_status()
+        except HTTPStatusError as e:
+            if e.response.status_code == 400:
+                raise QueryBadFormed(e.response.read())
+            elif e.response.status_code == 404:
+                raise EndPointNotFound(e.response.read())
+            elif e.response.status_code == 401:
+                raise Unauthorized(e.response.read())
+            elif e.response.status_code == 414:
+                raise URITooLong(e.response.read())
+            elif e.response.status_code == 500:
+                raise EndPointInternalError(e.response.read())
+            else:
+                raise e
+        # worst part of HACK
+        return cast(HTTPResponse, ResponseWrapper(response)), self.returnFormat
 
     async def asyncQuery(self) -> QueryResult:
         result = await self._asyncQuery()
@@ -0,0 +1,419 @@
+"""Scripts that measure the performance of the game tracker."""
+import argparse
+import asyncio
+import math
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, List
+import httpx
+from flask import Flask, session
+from flask_login import LoginManager, UserMixin, login_user
+from flask_session import Session
+from server.controllers.game_manager import GameManager, WIKIDATA_MAX_IDS
+from server.controllers.password_hasher import BCRYPT_ROUNDS, PasswordHasher
+from server.controllers.session_store import make_session_interface
+from server.models.entity_store import EntityStore
+from server.models.http_client import RATE_LIMITER, close_http_client
+from server.models.mysqldb import init_db, query_db_with_pool, local_db_host, local_db_passwd, local_db_port, local_db_user, game_db_schema_path
+from server.models.property_index import LearnedLabelStore, PropertyIndex, load_json_for_properties, property_json_path, property_index_path
+from utils.admin_tools import load_game_titles, game_list_json_path
+from utils.wikidata_stand_in import RecordingStore, WikidataStandIn, recordings_path
+
+DEFAULT_SERVER_URL = 'http://localhost:8080'
+DEFAULT_SEARCH_KEYWORDS = ['god of war', 'elden ring', 'final fantasy', 'gran turismo', 'stellar blade', 'astro bot']
+BENCHMARK_DB_NAME = 'game_db_benchmark' # a throwaway database, dropped after each benchmark
+
+
+def _search_worker(server_url: str, keywords: List[str], deadline: float) -> int:
+    """Sends `/blog/search` requests in a loop until the deadline and returns the number of successful ones."""
+    completed = 0
+    with httpx.Client(base_url=server_url, timeout=None) as client:
+        index = 0
+        while time.perf_counter() < deadline:
+            response = client.get('/blog/search', params={'search_keyword': keywords[index % len(keywords)]})
+            if response.status_code == 200:
+                completed += 1
+            index += 1
+    return completed
+
+
+def benchmark_search_load(server_url: str, concurrencies: List[int], duration: float, keywords: List[str]) -> List[Dict[str, float]]:
+    """Measures requests/sec of `/blog/search` for each number of concurrent clients.
+
+    Args:
+        server_url: the base URL of the running server.
+        concurrencies: the numbers of concurrent clients to measure with.
+        duration: the number of seconds to run each measurement for.
+        keywords: the search keywords the clients cycle through.
+
+    Returns:
+        a list of dictionaries holding the result of each measurement.
+    """
+    # Warm up so that the cold Wikidata path does not skew the first measurement.
+    with httpx.Client(base_url=server_url, timeout=None) as client:
+        for keyword in keywords:
+            client.get('/blog/search', params={'search_keyword': keyword})
+
+    results = []
+    for concurrency in concurrencies:
+        started = time.perf_counter()
+        deadline = started + duration
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(_search_worker, server_url, keywords, deadline) for _ in range(concurrency)]
+            completed = sum(future.result() for future in futures)
+        elapsed = time.perf_counter() - started
+        results.append({'clients': concurrency, 'requests': completed, 'seconds': elapsed, 'requests_per_sec': completed / elapsed})
+    return results
+
+
+def _make_fake_games(count: int, releases_per_game: int = 3) -> List[Dict]:
+    """Makes games shaped like the output of `GameManager._process_game_data_with_code`."""
+    games = []
+    for index in range(count):
+        games.append({
+            'title': f'Benchmark Game {index}',
+            'is_DLC': False,
+            'aliases': f'Benchmark Alias {index}, BG {index}',
+            'wikidata_code': f'QBENCH{index}',
+            'genres': 'action game, role-playing video game',
+            'developers': 'Benchmark Studio',
+            'publishers': 'Benchmark Publisher',
+            'parent_id': 'N/A',
+            'publication_dates': [{'publication_date': f'20{10 + release % 15}-0{1 + release % 9}-15', 'platforms': 'PlayStation 5'}
+                                  for release in range(releases_per_game)]
+        })
+    return games
+
+
+async def benchmark_insert_games(counts: List[int], batch_size: int) -> List[Dict[str, float]]:
+    """Measures rows/sec of `GameManager._insert_games` in a throwaway database.
+
+    Args:
+        counts: the numbers of games to insert, one measurement each.
+        batch_size: the number of games per call, 50 being the size of a search on Wikidata.
+
+    Returns:
+        a list of dictionaries holding the result of each measurement.
+    """
+    pool = await init_db(host=local_db_host, port=local_db_port, user=local_db_user, passwd=local_db_passwd,
+                         db_name=BENCHMARK_DB_NAME, schema_path=game_db_schema_path)
+    game_manager = GameManager(asyncio.get_running_loop(), pool)
+    results = []
+    try:
+        for count in counts:
+            await query_db_with_pool(pool, 'UPDATE', 'DELETE FROM date_platform_table;')
+            await query_db_with_pool(pool, 'UPDATE', 'DELETE FROM game_table;')
+            games = _make_fake_games(count)
+            rows = count + sum(len(game['publication_dates']) for game in games)
+
+            started = time.perf_counter()
+            for start in range(0, count, batch_size):
+                await game_manager._insert_games(games[start:start + batch_size])
+            elapsed = time.perf_counter() - started
+            results.append({'games': count, 'rows': rows, 'seconds': elapsed, 'rows_per_sec': rows / elapsed})
+    finally:
+        await query_db_with_pool(pool, 'UPDATE', f'DROP DATABASE {BENCHMARK_DB_NAME};')
+        pool.close()
+        await pool.wait_closed()
+    return results
+
+
+def _percentile(sorted_samples: List[float], fraction: float) -> float:
+    """Picks the nearest-rank percentile of samples sorted in ascending order."""
+    return sorted_samples[max(math.ceil(fraction * len(sorted_samples)) - 1, 0)]
+
+
+async def _time_calls(path: str, call: Callable[[Any], Awaitable], arguments: List) -> Dict[str, Any]:
+    """Awaits a call per argument one after another and summarizes the latencies."""
+    latencies = []
+    failures = 0
+    started = time.perf_counter()
+    for argument in arguments:
+        call_started = time.perf_counter()
+        try:
+            await call(argument)
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {'path': path, 'calls': len(arguments), 'failures': failures,
+            'p50_ms': _percentile(latencies, 0.50) * 1000, 'p90_ms': _percentile(latencies, 0.90) * 1000,
+            'p99_ms': _percentile(latencies, 0.99) * 1000, 'max_ms': latencies[-1] * 1000,
+            'calls_per_sec': len(arguments) / elapsed}
+
+
+async def benchmark_hot_paths(title_count: int, recordings: str, record: bool) -> List[Dict[str, Any]]:
+    """Measures the search and ingest paths of `GameManager` against local stand-ins.
+
+    Wikidata is replaced by `WikidataStandIn` replaying recorded responses, and game_db by a throwaway database.
+    The entity store and the learned labels start empty in a temporary directory, so that the first searches are cold.
+    Half of the titles of `All_PlayStation_Games.json` are searched, the other half ingested like `fill_up_game_db` does.
+    Run once with `record` to record the responses missing from `recordings`, then without it for reproducible numbers.
+
+    Args:
+        title_count: the number of titles taken from the start of `All_PlayStation_Games.json`.
+        recordings: the file of recorded Wikidata responses.
+        record: a flag to forward the requests missing from the recordings to Wikidata and record them.
+
+    Returns:
+        a list of dictionaries holding the latency percentiles and the throughput of each path.
+    """
+    titles = list(islice(load_game_titles(game_list_json_path), title_count))
+    search_titles, ingest_titles = titles[::2], titles[1::2]
+
+    stand_in = WikidataStandIn(RecordingStore(recordings), record=record).start()
+    # The stand-in spaces out the requests it forwards itself, and replaying needs no politeness.
+    interval, RATE_LIMITER.interval = RATE_LIMITER.interval, 0.0
+    pool = await init_db(host=local_db_host, port=local_db_port, user=local_db_user, passwd=local_db_passwd,
+                         db_name=BENCHMARK_DB_NAME, schema_path=game_db_schema_path)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            game_manager = GameManager(asyncio.get_running_loop(), pool)
+            game_manager.api_url = stand_in.api_url
+            game_manager.entity_store = EntityStore(os.path.join(cache_dir, 'wikidata_entities.sqlite'))
+            game_manager.learned_labels = LearnedLabelStore(os.path.join(cache_dir, 'learned_labels.sqlite'))
+            await game_manager.build_search_index()
+
+            async def warm_search(title):
+                game_manager.search_cache.clear()
+                game_manager.negative_cache.clear()
+                await game_manager.find_candiates(title)
+
+            async def ingest(title):
+                entity_codes = await game_manager._search_wikidata(title)
+                await game_manager._add_new_games(entity_codes)
+
+            async def parse(codes):
+                metadata = await game_manager._get_metadata(codes, language='en')
+                for raw_metadata in metadata.values():
+                    if raw_metadata is not None:
+                        game_manager._process_game_data_with_code(raw_metadata)
+
+            results.append(await _time_calls('cold search', game_manager.find_candiates, search_titles))
+            results.append(await _time_calls('warm search', warm_search, search_titles))
+            results.append(await _time_calls('cached search', game_manager.find_candiates, search_titles))
+            results.append(await _time_calls('bulk ingest', ingest, ingest_titles))
+
+            game_manager.offline = True
+            codes = list(game_manager.entity_store.iter_codes('en'))
+            chunks = [codes[i:i + WIKIDATA_MAX_IDS] for i in range(0, len(codes), WIKIDATA_MAX_IDS)]
+            results.append(await _time_calls(f'parse {WIKIDATA_MAX_IDS} entities', parse, chunks))
+            game_manager.entity_store.close()
+    finally:
+        RATE_LIMITER.interval = interval
+        stand_in.stop()
+        stand_in.store.close()
+        await close_http_client()
+        await query_db_with_pool(pool, 'UPDATE', f'DROP DATABASE {BENCHMARK_DB_NAME};')
+        pool.close()
+        await pool.wait_closed()
+    print(f'Wikidata stand-in | hits: {stand_in.hits} | misses: {stand_in.misses}')
+    return results
+
+
+def _measure(function, repeat: int) -> Dict[str, float]:
+    """Measures the mean time and the peak memory allocated by a function."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'mean_ms': elapsed / repeat * 1000, 'peak_kib': peak / 1024}
+
+
+def benchmark_property_loading(repeat: int) -> List[Dict[str, float]]:
+    """Compares parsing `wikidata_properties.json` per instance with opening the precompiled property index.
+
+    Both include the first lookup of a code, which is when the index is actually opened.
+    """
+    PropertyIndex(property_json_path, property_index_path)._connect() # builds the index once beforehand
+
+    def load_json():
+        load_json_for_properties(property_json_path)['genres'].get('Q23916')
+
+    def open_index():
+        property_index = PropertyIndex(property_json_path, property_index_path)
+        property_index.lookup('genres', ['Q23916'])
+        property_index.close()
+
+    return [{'loader': 'json', **_measure(load_json, repeat)},
+            {'loader': 'index', **_measure(open_index, repeat)}]
+
+
+def benchmark_logins(pool_sizes: List[int], rounds: int, clients: int, duration: float) -> List[Dict[str, float]]:
+    """Measures logins/sec, i.e. password verifications, for each number of `PasswordHasher` workers.
+
+    Args:
+        pool_sizes: the numbers of workers to measure with.
+        rounds: the bcrypt cost factor.
+        clients: the number of threads logging in at the same time, like the Flask request threads.
+        duration: the number of seconds to run each measurement for.
+
+    Returns:
+        a list of dictionaries holding the result of each measurement.
+    """
+    hasher = PasswordHasher(rounds=rounds, workers=1)
+    hashed_password = hasher.hash('benchmark password')
+    hasher.shutdown()
+
+    def log_in_until(hasher: PasswordHasher, deadline: float) -> int:
+        completed = 0
+        while time.perf_counter() < deadline:
+            if hasher.verify('benchmark password', hashed_password):
+                completed += 1
+        return completed
+
+    results = []
+    for workers in pool_sizes:
+        hasher = PasswordHasher(rounds=rounds, workers=workers, max_pending=clients)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            futures = [executor.submit(log_in_until, hasher, started + duration) for _ in range(clients)]
+            completed = sum(future.result() for future in futures)
+        elapsed = time.perf_counter() - started
+        hasher.shutdown()
+        results.append({'workers': workers, 'logins': completed, 'seconds': elapsed, 'logins_per_sec': completed / elapsed,
+                        'peak_queue_depth': max(hasher.peak_pending - workers, 0)})
+    return results
+
+
+class _BenchmarkUser(UserMixin):
+    def __init__(self, user_id: str):
+        self.id = user_id
+
+
+def _make_session_app(backend: str, session_dir: str) -> Flask:
+    """Makes a Flask app with a session backend and Flask-Login set up like app.py, with one view touching the session and one not.
+
+    Flask-Login's hooks run on every request, so the untouched view measures what a request pays even if its view ignores the session.
+    """
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+    if backend == 'filesystem':
+        app.config['SESSION_TYPE'] = 'filesystem'
+        app.config['SESSION_FILE_DIR'] = session_dir
+        Session(app)
+    else:
+        app.session_interface = make_session_interface(backend)
+
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.session_protection = 'strong'
+    login_manager.user_loader(_BenchmarkUser)
+
+    @app.route('/log_in')
+    def log_in():
+        login_user(_BenchmarkUser('benchmark'), remember=True)
+        return ''
+
+    @app.route('/touch')
+    def touch():
+        session['visits'] = session.get('visits', 0) + 1
+        return ''
+
+    @app.route('/read')
+    def read():
+        return str(session.get('visits', 0))
+
+    @app.route('/untouched')
+    def untouched():
+        return ''
+
+    return app
+
+
+def benchmark_sessions(backends: List[str], requests: int) -> List[Dict[str, float]]:
+    """Measures the time per request of each session backend, against an app without sessions as the baseline.
+
+    Each view is requested by a logged-in client whose session already exists.
+
+    Args:
+        backends: the session backends to measure, `filesystem`, `memory` or `mongodb`.
+        requests: the number of requests per view.
+
+    Returns:
+        a list of dictionaries holding the mean time per request of each view, in microseconds.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as session_dir:
+        for backend in ['none'] + backends:
+            if backend == 'none':
+                app = Flask(__name__)
+                for view in ('touch', 'read', 'untouched'):
+                    app.add_url_rule(f'/{view}', view, lambda: '')
+            else:
+                app = _make_session_app(backend, session_dir)
+            result = {'backend': backend}
+            with app.test_client() as client:
+                if backend != 'none':
+                    client.get('/log_in')
+                client.get('/touch')
+                for view in ('touch', 'read', 'untouched'):
+                    started = time.perf_counter()
+                    for _ in range(requests):
+                        client.get(f'/{view}')
+                    result[f'{view}_us'] = (time.perf_counter() - started) / requests * 1e6
+            results.append(result)
+    return results
+
+
+def _print_results(title: str, results: List[Dict[str, float]]) -> None:
+    """Prints the results of a benchmark as a table."""
+    print(title)
+    for result in results:
+        print(' | '.join(f'{key}: {value:.2f}' if isinstance(value, float) else f'{key}: {value}' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Benchmark the game tracker.')
+    sub_parsers = arg_parser.add_subparsers(dest='benchmark', required=True)
+
+    search_parser = sub_parsers.add_parser('search', help='Load test `/blog/search` of a running server.')
+    search_parser.add_argument('--url', type=str, default=DEFAULT_SERVER_URL, help='The base URL of the running server.')
+    search_parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 64], help='The numbers of concurrent clients.')
+    search_parser.add_argument('--duration', type=float, default=10.0, help='The number of seconds per measurement.')
+
+    insert_parser = sub_parsers.add_parser('insert', help='Measure bulk inserts of games into a throwaway database.')
+    insert_parser.add_argument('--games', type=int, nargs='+', default=[1000, 10000], help='The numbers of games to insert.')
+    insert_parser.add_argument('--batch_size', type=int, default=50, help='The number of games per insert call.')
+
+    paths_parser = sub_parsers.add_parser('paths', help='Measure the search and ingest paths against a Wikidata stand-in and a throwaway database.')
+    paths_parser.add_argument('--titles', type=int, default=200, help='The number of titles to search and ingest.')
+    paths_parser.add_argument('--recordings', type=str, default=recordings_path, help='The file of recorded Wikidata responses.')
+    paths_parser.add_argument('--record', action='store_true', help='Record the Wikidata responses missing from the recordings.')
+
+    logins_parser = sub_parsers.add_parser('logins', help='Measure logins/sec of the password hasher for each pool size.')
+    logins_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='The numbers of hashing workers.')
+    logins_parser.add_argument('--rounds', type=int, default=BCRYPT_ROUNDS, help='The bcrypt cost factor.')
+    logins_parser.add_argument('--clients', type=int, default=32, help='The number of concurrent logins.')
+    logins_parser.add_argument('--duration', type=float, default=5.0, help='The number of seconds per measurement.')
+
+    sessions_parser = sub_parsers.add_parser('sessions', help='Measure the per-request overhead of the session backends.')
+    sessions_parser.add_argument('--backends', type=str, nargs='+', default=['filesystem', 'memory', 'mongodb'], help='The session backends.')
+    sessions_parser.add_argument('--requests', type=int, default=2000, help='The number of requests per view.')
+
+    startup_parser = sub_parsers.add_parser('startup', help='Compare the ways of loading the labels of Wikidata codes.')
+    startup_parser.add_argument('--repeat', type=int, default=20, help='The number of loads to average over.')
+
+    args = arg_parser.parse_args()
+
+    if args.benchmark == 'search':
+        _print_results('/blog/search', benchmark_search_load(args.url, args.clients, args.duration, DEFAULT_SEARCH_KEYWORDS))
+    elif args.benchmark == 'insert':
+        _print_results('GameManager._insert_games', asyncio.run(benchmark_insert_games(args.games, args.batch_size)))
+    elif args.benchmark == 'paths':
+        _print_results('GameManager hot paths', asyncio.run(benchmark_hot_paths(args.titles, args.recordings, args.record)))
+    elif args.benchmark == 'logins':
+        _print_results('PasswordHasher.verify', benchmark_logins(args.workers, args.rounds, args.clients, args.duration))
+    elif args.benchmark == 'sessions':
+        _print_results('Session overhead per request', benchmark_sessions(args.backends, args.requests))
+    elif args.benchmark == 'startup':
+        _print_results('Loading the labels of Wikidata codes', benchmark_property_loading(args.repeat))
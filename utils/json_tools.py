@@ -1,19 +1,189 @@
+"""Reads and merges the game list dumps without loading a whole file into memory."""
+import argparse
+import hashlib
 import json
 import glob
 import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
 
 game_json_path = os.path.join(os.getcwd(), 'DB', '*.json')
 
-json_files = glob.glob(game_json_path)
+JSON_CHUNK_SIZE = 64 * 1024 # the number of characters read from a file at a time
+NUMBER_CHARACTERS = frozenset('0123456789.eE+-') # the characters that may continue a json number
 
-merged_data = []
 
-for file in json_files:
-    with open(file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        merged_data.extend(data)
+def is_number(element: Any) -> bool:
+    """Checks if a decoded json value is a number, which json decodes into an int or a float but never a bool."""
+    return isinstance(element, (int, float)) and not isinstance(element, bool)
 
-unique_data = {json.dumps(item, sort_keys=True, ensure_ascii=False): item for item in merged_data}.values()
 
-with open('All_PlayStation_Games.json', 'w', encoding='utf-8') as outfile:
-    json.dump(list(unique_data), outfile, indent=4, ensure_ascii=False)
+def iter_json_array(json_path: str, chunk_size: int = JSON_CHUNK_SIZE) -> Iterator[Any]:
+    """Yields the elements of a top-level json array one at a time, reading the file in chunks.
+
+    Only the element being decoded is held in memory, so the first element is available right away
+    and memory stays flat however large the file is.
+
+    Raises:
+        ValueError: if the file is not a json array.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        position = 0
+        eof = False
+
+        def skip_whitespace() -> bool:
+            """Moves `position` to the next non-whitespace character, reading more if needed. False at the end of the file."""
+            nonlocal buffer, position, eof
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer):
+                    return True
+                if eof:
+                    return False
+                buffer = f.read(chunk_size)
+                position = 0
+                eof = not buffer
+
+        if not skip_whitespace() or buffer[position] != '[':
+            raise ValueError(f'{json_path} is not a json array.')
+        position += 1
+        expecting_element = True
+
+        while True:
+            if not skip_whitespace():
+                raise ValueError(f'{json_path} ends in the middle of the array.')
+            if buffer[position] == ']':
+                return
+            if not expecting_element:
+                if buffer[position] != ',':
+                    raise ValueError(f'{json_path} has an unexpected {buffer[position]!r} between elements.')
+                position += 1
+                expecting_element = True
+                continue
+
+            while True:
+                try:
+                    element, end = decoder.raw_decode(buffer, position)
+                    # A number or a literal cut at the end of the buffer decodes too, so it must be followed by something,
+                    # and a number cut after its `.` or `e` decodes up to there, so it must not be followed by the rest of one.
+                    if eof or (end < len(buffer) and not (is_number(element) and buffer[end] in NUMBER_CHARACTERS)):
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+
+            yield element
+            position = end
+            expecting_element = False
+
+
+def iter_json_lines(jsonl_path: str) -> Iterator[Any]:
+    """Yields the records of a JSONL file, one per non-empty line."""
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_json_records(path: str) -> Iterator[Any]:
+    """Yields the records of a `.jsonl` file or of a json file holding an array."""
+    if path.endswith('.jsonl'):
+        return iter_json_lines(path)
+    return iter_json_array(path)
+
+
+def iter_game_titles(path: str, filter_conditions: Iterable[str] = ()) -> Iterator[str]:
+    """Yields the titles of a game list dump, leaving out the entries having any of the filtered genres."""
+    filtered_genres = set(filter_conditions)
+    for game_entry in iter_json_records(path):
+        if any(genre in filtered_genres for genre in game_entry.get('genres', None) or []):
+            continue
+        yield game_entry['title']
+
+
+class MergeStats:
+    """Counters of `merge_json_files`, per input file."""
+    def __init__(self):
+        self.records: Dict[str, int] = {}
+        self.duplicates: Dict[str, int] = {}
+        self.written = 0
+
+
+    def report(self) -> str:
+        """Makes a summary of the records read, written and dropped as duplicates."""
+        lines = [f'{path}: {self.records[path]} records, {self.duplicates[path]} duplicates' for path in self.records]
+        lines.append(f'total: {sum(self.records.values())} records, {sum(self.duplicates.values())} duplicates, {self.written} written')
+        return '\n'.join(lines)
+
+
+def content_hash(item: Any) -> int:
+    """Hashes the canonical json of a record into 64 bits, which keeps a set of seen records small."""
+    canonical = json.dumps(item, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return int.from_bytes(hashlib.blake2b(canonical.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def merge_json_files(json_paths: List[str], output_path: str, by_content: bool = False,
+                     duplicates_path: Optional[str] = None) -> MergeStats:
+    """Merges the dumps into one JSONL file, streaming the records and dropping the duplicates.
+
+    A record is a duplicate if its MobyGames `id` was seen before. Records without an `id`, or every record
+    when `by_content` is set, are compared by a 64-bit hash of their content instead.
+    Only the keys seen so far are held in memory, never the records.
+    The output is written to a temporary file first and moved into place once complete.
+
+    Args:
+        json_paths: the json or JSONL files to merge, in order of priority.
+        output_path: the JSONL file to write.
+        by_content: a flag to dedupe by content instead of by `id`.
+        duplicates_path: a JSONL file to write the dropped records into, for review.
+    """
+    stats = MergeStats()
+    seen_ids: Set[Any] = set()
+    seen_hashes: Set[int] = set()
+    temp_path = f'{output_path}.{os.getpid()}.tmp'
+
+    with open(temp_path, 'w', encoding='utf-8') as outfile, \
+            open(duplicates_path or os.devnull, 'w', encoding='utf-8') as duplicates_file:
+        for json_path in json_paths:
+            stats.records[json_path] = 0
+            stats.duplicates[json_path] = 0
+            for item in iter_json_records(json_path):
+                stats.records[json_path] += 1
+                line = json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+                if not by_content and isinstance(item, dict) and item.get('id') is not None:
+                    seen, key = seen_ids, item['id']
+                else:
+                    seen, key = seen_hashes, content_hash(item)
+                if key in seen:
+                    stats.duplicates[json_path] += 1
+                    duplicates_file.write(f'{line}\n')
+                    continue
+                seen.add(key)
+                outfile.write(f'{line}\n')
+                stats.written += 1
+    os.replace(temp_path, output_path)
+
+    return stats
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Tools for the game list dumps.')
+    sub_parsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    merge_parser = sub_parsers.add_parser('merge', help='Merge dumps into one JSONL file without duplicates.')
+    merge_parser.add_argument('inputs', type=str, nargs='*', help=f'The json or JSONL files to merge, {game_json_path} by default.')
+    merge_parser.add_argument('--output', type=str, default='All_PlayStation_Games.jsonl', help='The JSONL file to write.')
+    merge_parser.add_argument('--by_content', action='store_true', help='Dedupe by a hash of the whole record instead of its id.')
+    merge_parser.add_argument('--duplicates', type=str, default=None, help='A JSONL file to write the dropped records into.')
+
+    args = arg_parser.parse_args()
+
+    if args.command == 'merge':
+        stats = merge_json_files(args.inputs or sorted(glob.glob(game_json_path)), args.output, args.by_content, args.duplicates)
+        print(stats.report())
@@ -0,0 +1,157 @@
+"""A local stand-in for the Wikidata API that replays recorded responses, to benchmark without the network."""
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+import httpx
+from server.models.http_client import HTTP_REQUESTS_PER_SECOND, HTTP_TIMEOUT, USER_AGENT
+
+recordings_path = os.path.join(os.getcwd(), 'server', 'cache', 'wikidata_recordings.sqlite')
+UPSTREAM_API_URL = 'https://www.wikidata.org/w/api.php'
+
+
+def make_recording_key(query: str) -> str:
+    """Makes the key of a request from its query string, independent of the order of the parameters."""
+    params = sorted(parse_qsl(query, keep_blank_values=True))
+    return hashlib.sha1(repr(params).encode('utf-8')).hexdigest()
+
+
+class RecordingStore:
+    """A SQLite file of the recorded responses keyed by `make_recording_key`."""
+    def __init__(self, path: str = recordings_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self.connection.execute('PRAGMA journal_mode=WAL;')
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS recordings (
+                    key TEXT NOT NULL PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    body BLOB NOT NULL
+                ) WITHOUT ROWID;""")
+
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self.connection.execute('SELECT body FROM recordings WHERE key = ?;', (key,)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+
+    def put(self, key: str, query: str, body: bytes) -> None:
+        with self._lock:
+            self.connection.execute('INSERT OR REPLACE INTO recordings VALUES (?, ?, ?);', (key, query, zlib.compress(body)))
+
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute('SELECT COUNT(*) FROM recordings;').fetchone()[0]
+
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
+
+
+class WikidataStandIn:
+    """Serves recorded Wikidata responses on a local port.
+
+    In record mode, requests missing from the recordings are forwarded to Wikidata one at a time,
+    at most `HTTP_REQUESTS_PER_SECOND` per second, and their responses are recorded.
+    In replay mode, they are answered with 404 and counted in `misses`.
+    """
+    def __init__(self, store: RecordingStore, record: bool = False, port: int = 0):
+        self.store = store
+        self.record = record
+        self.hits = 0
+        self.misses = 0
+        self._upstream_lock = threading.Lock()
+        self._upstream: Optional[httpx.Client] = None
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+
+    @property
+    def api_url(self) -> str:
+        """The URL to use in place of `WIKIDATA_API_URL`."""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/w/api.php'
+
+
+    def _fetch_upstream(self, query: str) -> Tuple[int, bytes]:
+        """Forwards a request to Wikidata, spacing the requests out like `get_json` does."""
+        with self._upstream_lock:
+            if self._upstream is None:
+                self._upstream = httpx.Client(timeout=HTTP_TIMEOUT, headers={'User-Agent': USER_AGENT})
+            response = self._upstream.get(f'{UPSTREAM_API_URL}?{query}')
+            time.sleep(1.0 / HTTP_REQUESTS_PER_SECOND if HTTP_REQUESTS_PER_SECOND > 0 else 0.0)
+        return response.status_code, response.content
+
+
+    def _respond(self, query: str) -> Tuple[int, bytes]:
+        key = make_recording_key(query)
+        body = self.store.get(key)
+        if body is not None:
+            self.hits += 1
+            return 200, body
+        self.misses += 1
+        if not self.record:
+            return 404, b'{"error": "not recorded"}'
+        status_code, body = self._fetch_upstream(query)
+        if status_code == 200:
+            self.store.put(key, query, body)
+        return status_code, body
+
+
+    def _make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status_code, body = stand_in._respond(urlsplit(self.path).query)
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+    def start(self) -> 'WikidataStandIn':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._upstream is not None:
+            self._upstream.close()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Serve recorded Wikidata responses locally.')
+    arg_parser.add_argument('--port', type=int, default=8765, help='The local port to listen on.')
+    arg_parser.add_argument('--recordings', type=str, default=recordings_path, help='The file of recorded responses.')
+    arg_parser.add_argument('--record', action='store_true', help='Forward and record the requests missing from the recordings.')
+    args = arg_parser.parse_args()
+
+    stand_in = WikidataStandIn(RecordingStore(args.recordings), record=args.record, port=args.port).start()
+    print(f'Serving {len(stand_in.store)} recorded responses at {stand_in.api_url}, e.g. with WIKIDATA_API_URL={stand_in.api_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stand_in.stop()
+        print(f'hits: {stand_in.hits} | misses: {stand_in.misses}')